@@ -27,6 +27,7 @@ import os
 from config import Config
 from database import db
 from cache import analytics_cache, cached_query
+from timezone_utils import format_batch
 
 logger = logging.getLogger(__name__)
 
@@ -44,9 +45,8 @@ class LocationAnalytics:
                 return cached_address
         
         try:
-            # Use the new multi-provider geocoding manager
-            geocoding_manager = get_geocoding_manager()
-            address = geocoding_manager.get_address_from_coordinates(latitude, longitude)
+            # Multi-provider geocoding; the manager caches results with its own TTLs
+            address = get_address_from_coordinates(latitude, longitude)
             
             if address:
                 formatted_address = self._format_address(address)
@@ -785,6 +785,8 @@ class LocationAnalytics:
         
         # Group by device and sort by timestamp
         device_tracks = defaultdict(list)
+        points = []
+        epochs = []
         
         for location in locations:
             try:
@@ -798,23 +800,28 @@ class LocationAnalytics:
                 else:
                     dt = timestamp
                 
-                # Convert to CST for display
                 if dt.tzinfo is None:
                     dt = pytz.UTC.localize(dt)
-                cst_dt = dt.astimezone(self.timezone)
+                epoch = dt.timestamp()
                 
-                device_tracks[location['device_name']].append({
+                point = {
                     'latitude': float(location['latitude']),
                     'longitude': float(location['longitude']),
                     'timestamp': dt.isoformat(),
-                    'timestamp_cst': cst_dt.strftime('%Y-%m-%d %I:%M:%S %p CST'),
                     'device_name': location['device_name'],
-                    'unix_timestamp': int(dt.timestamp())
-                })
+                    'unix_timestamp': int(epoch)
+                }
+                device_tracks[location['device_name']].append(point)
+                points.append(point)
+                epochs.append(epoch)
             except Exception as e:
                 logger.warning(f"Error processing location for playback: {e}")
                 continue
         
+        # Convert to CST for display in one pass
+        for point, formatted in zip(points, format_batch(epochs, Config.TIMEZONE, '%Y-%m-%d %I:%M:%S %p CST')):
+            point['timestamp_cst'] = formatted
+        
         # Sort each device's track by timestamp
         for device in device_tracks:
             device_tracks[device].sort(key=lambda x: x['unix_timestamp'])
@@ -1577,10 +1584,8 @@ Sent by iTrax GPS Tracking System
             with db.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT sn.*, nr.name as rule_name, g.name as geofence_name
+                    SELECT sn.*
                     FROM sent_notifications sn
-                    LEFT JOIN notification_rules nr ON sn.rule_id = nr.id
-                    LEFT JOIN geofences g ON sn.geofence_id = g.id
                     ORDER BY sn.timestamp DESC
                     LIMIT %s
                 ''', (limit,))
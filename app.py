@@ -31,6 +31,7 @@ from timezone_utils import (
 )
 import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import g
 
 # Configure logging
@@ -64,6 +65,11 @@ except Exception as _e:
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Runs independent dashboard queries side by side; kept below the DB pool size
+# so request threads can still get a connection while these are in flight
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, Config.DATABASE_POOL_SIZE // 2),
+                                 thread_name_prefix='db-query')
+
 # Enable response compression for better performance
 compress = Compress(app)
 
@@ -101,17 +107,12 @@ def convert_to_cst(timestamp_str):
     """Convert timestamp string to CST"""
     try:
         if isinstance(timestamp_str, str):
-            # Handle various timestamp formats
+            # fromisoformat reads offsets like "-05:00" itself; only a trailing 'Z'
+            # needs rewriting, and naive values are marked UTC below
             if timestamp_str.endswith('Z'):
-                dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            elif '+' in timestamp_str or '-' in timestamp_str[-6:]:
-                # Handle timezone-aware timestamps like "2025-08-09T15:32:09.710190-05:00"
-                dt = datetime.fromisoformat(timestamp_str)
+                dt = datetime.fromisoformat(timestamp_str[:-1] + '+00:00')
             else:
-                # Handle timezone-naive timestamps
                 dt = datetime.fromisoformat(timestamp_str)
-                if dt.tzinfo is None:
-                    dt = pytz.UTC.localize(dt)
         else:
             dt = timestamp_str
             
@@ -467,6 +468,39 @@ def settings():
         flash('An error occurred while loading settings.', 'error')
         return redirect(url_for('dashboard'))
 
+def _load_available_devices():
+    """Active devices with display names for the dashboard filter dropdown"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT l.device_name,
+                       COALESCE(d.nickname, l.device_name) AS display_name
+                FROM locations l
+                LEFT JOIN devices d ON l.device_name = d.device_name
+                WHERE l.device_name IS NOT NULL AND l.device_name != ''
+                  AND (d.is_active IS NULL OR d.is_active = TRUE)
+                ORDER BY display_name
+            ''')
+            rows = cursor.fetchall()
+            return [
+                {'device_name': row['device_name'], 'display_name': row['display_name']}
+                for row in rows
+            ]
+    except Exception as e:
+        logger.error(f"Error getting device list: {e}")
+        return []
+
+def _load_inactive_devices():
+    """Names of devices hidden from the dashboard map"""
+    try:
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT device_name FROM devices WHERE is_active = FALSE")
+            return {row['device_name'] for row in cursor.fetchall()}
+    except Exception:
+        return set()
+
 @app.route('/')
 @login_required
 def dashboard():
@@ -476,6 +510,12 @@ def dashboard():
         selected_date = request.args.get('date')  # Format: YYYY-MM-DD
         device_name = request.args.get('device')
         
+        # These don't depend on the request, so run them on their own pooled
+        # connections while the location history is loaded below
+        available_devices_future = DB_EXECUTOR.submit(_load_available_devices)
+        inactive_future = DB_EXECUTOR.submit(_load_inactive_devices)
+        stats_future = DB_EXECUTOR.submit(db.get_statistics)
+        
         # If no date provided, default to today's date in user timezone
         if not selected_date:
             today = get_cst_now().strftime('%Y-%m-%d')
@@ -526,41 +566,16 @@ def dashboard():
                 location_history = []
 
         # Get list of available devices for filter dropdown (only active devices, with display names)
-        available_devices = []
-        try:
-            with db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT DISTINCT l.device_name,
-                           COALESCE(d.nickname, l.device_name) AS display_name
-                    FROM locations l
-                    LEFT JOIN devices d ON l.device_name = d.device_name
-                    WHERE l.device_name IS NOT NULL AND l.device_name != ''
-                      AND (d.is_active IS NULL OR d.is_active = TRUE)
-                    ORDER BY display_name
-                ''')
-                rows = cursor.fetchall()
-                available_devices = [
-                    {'device_name': row['device_name'], 'display_name': row['display_name']}
-                    for row in rows
-                ]
-        except Exception as e:
-            logger.error(f"Error getting device list: {e}")
+        available_devices = available_devices_future.result()
 
         # Ensure JSON-serializable location objects for the template, filter inactive devices
         safe_locations = [serialize_location_row(row) for row in (location_history or [])]
-        try:
-            with db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT device_name FROM devices WHERE is_active = FALSE")
-                inactive = {row['device_name'] for row in cursor.fetchall()}
-        except Exception:
-            inactive = set()
+        inactive = inactive_future.result()
         if inactive:
             safe_locations = [loc for loc in safe_locations if loc.get('device_name') not in inactive]
 
         # Get statistics for dashboard display
-        stats = db.get_statistics()
+        stats = stats_future.result()
         # Determine offline devices (no recent update in last 2 hours)
         offline_devices = set()
         try:
@@ -1760,6 +1775,7 @@ def gps_logs():
             
             # Optimize address lookup - only for visible records and use batch processing
             if logs_data:
+                addresses_to_cache = []
                 # Add addresses in batches to avoid overwhelming reverse geocoding APIs
                 batch_size = 10
                 for i in range(0, len(logs_data), batch_size):
@@ -1781,13 +1797,15 @@ def gps_logs():
                                         if full_address and len(full_address) > 10:  # Valid address
                                             log['address'] = full_address
                                             # Cache the result for future use
-                                            db.cache_address(log['latitude'], log['longitude'], full_address)
+                                            addresses_to_cache.append((log['latitude'], log['longitude'], full_address))
                                     except Exception as e:
                                         logger.debug(f"Failed to get address from coordinates {log['latitude']}, {log['longitude']}: {e}")
                                         # Keep coordinate format on API failure
                         except Exception as e:
                             logger.debug(f"Could not process address for {log['latitude']}, {log['longitude']}: {e}")
                             log['address'] = f"({log['latitude']:.4f}, {log['longitude']:.4f})"
+                
+                db.cache_addresses_bulk(addresses_to_cache)
             
             # Cache the result for future requests
             _cache_logs(cache_key, (logs_data, total_count, available_devices))
@@ -1809,6 +1827,7 @@ def gps_logs():
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.args.get('addresses_only'):
             # Enhanced address loading for prefetching
             enhanced_logs = []
+            addresses_to_cache = []
             for log in logs_data:
                 enhanced_log = dict(log)
                 
@@ -1819,13 +1838,15 @@ def gps_logs():
                         if full_address and len(full_address) > 10:
                             enhanced_log['address'] = full_address
                             # Cache for future use
-                            db.cache_address(enhanced_log['latitude'], enhanced_log['longitude'], full_address)
+                            addresses_to_cache.append((enhanced_log['latitude'], enhanced_log['longitude'], full_address))
                     except Exception as e:
                         logger.debug(f"Failed to get address from coordinates {enhanced_log['latitude']}, {enhanced_log['longitude']}: {e}")
                         # Keep existing format if geocoding fails
                 
                 enhanced_logs.append(enhanced_log)
             
+            db.cache_addresses_bulk(addresses_to_cache)
+            
             return jsonify({
                 'success': True,
                 'logs': enhanced_logs,
@@ -2744,19 +2765,22 @@ def cleanup_caches_on_startup():
     except Exception as e:
         logger.error(f"Error during startup cache cleanup: {e}")
 
-# Run cleanup on startup
-cleanup_caches_on_startup()
+# The scheduler's spawned worker re-imports this script as __mp_main__; only the
+# real server process runs the startup tasks
+if __name__ != '__mp_main__':
+    # Run cleanup on startup
+    cleanup_caches_on_startup()
 
-# Start the top locations cache scheduler
-try:
-    start_scheduler()
-    logger.info("Top locations cache scheduler started successfully")
-except Exception as e:
-    logger.error(f"Failed to start top locations cache scheduler: {e}")
-
-# Shutdown handler for scheduler
-import atexit
-atexit.register(stop_scheduler)
+    # Start the top locations cache scheduler
+    try:
+        start_scheduler()
+        logger.info("Top locations cache scheduler started successfully")
+    except Exception as e:
+        logger.error(f"Failed to start top locations cache scheduler: {e}")
+
+    # Shutdown handler for scheduler
+    import atexit
+    atexit.register(stop_scheduler)
 
 if __name__ == '__main__':
     try:
@@ -41,7 +41,7 @@ class BackupScheduler:
         """Create a database backup with timestamp"""
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f"itrax_backup_{timestamp}.sql"
+            backup_filename = f"itrax_backup_{timestamp}.sql.gz"
             backup_path = self.backup_dir / backup_filename
             
             logger.info(f"Creating scheduled backup: {backup_filename}")
@@ -50,12 +50,12 @@ class BackupScheduler:
             result = db.backup_database(str(backup_path))
             
             if result:
-                logger.info(f"✅ Backup created successfully: {backup_path}")
+                logger.info(f"✅ Backup created successfully: {result}")
                 
                 # Clean up old backups
                 self.cleanup_old_backups()
                 
-                return str(backup_path)
+                return result
             else:
                 logger.error(f"❌ Failed to create backup: {backup_filename}")
                 return None
@@ -70,10 +70,10 @@ class BackupScheduler:
             cutoff_date = datetime.now() - timedelta(days=self.retention_days)
             removed_count = 0
             
-            for backup_file in self.backup_dir.glob("itrax_backup_*.sql"):
+            for backup_file in self.backup_dir.glob("itrax_backup_*.sql*"):
                 try:
                     # Extract timestamp from filename
-                    filename_parts = backup_file.stem.split('_')
+                    filename_parts = backup_file.name.split('.', 1)[0].split('_')
                     if len(filename_parts) >= 3:
                         date_str = filename_parts[2]
                         time_str = filename_parts[3] if len(filename_parts) > 3 else "000000"
@@ -103,13 +103,13 @@ class BackupScheduler:
             backups = []
             total_size = 0
             
-            for backup_file in sorted(self.backup_dir.glob("itrax_backup_*.sql"), reverse=True):
+            for backup_file in sorted(self.backup_dir.glob("itrax_backup_*.sql*"), reverse=True):
                 try:
                     file_size = backup_file.stat().st_size
                     total_size += file_size
                     
                     # Parse timestamp from filename
-                    filename_parts = backup_file.stem.split('_')
+                    filename_parts = backup_file.name.split('.', 1)[0].split('_')
                     if len(filename_parts) >= 3:
                         date_str = filename_parts[2]
                         time_str = filename_parts[3] if len(filename_parts) > 3 else "000000"
@@ -197,7 +197,7 @@ class BackupScheduler:
             logger.info("✅ Backup scheduler started successfully")
             
             # Create initial backup if none exist
-            if not list(self.backup_dir.glob("itrax_backup_*.sql")):
+            if not list(self.backup_dir.glob("itrax_backup_*.sql*")):
                 logger.info("No existing backups found, creating initial backup...")
                 self.create_backup()
             
@@ -4,7 +4,6 @@ High-performance caching layer for database queries and API responses
 """
 
 import time
-import hashlib
 import json
 import logging
 from typing import Any, Dict, Optional, Tuple
@@ -109,8 +108,9 @@ def cache_key_generator(*args, **kwargs) -> str:
         'args': args,
         'kwargs': kwargs
     }
-    key_string = json.dumps(key_data, sort_keys=True, default=str)
-    return hashlib.md5(key_string.encode()).hexdigest()
+    # Only ever used as an in-memory dict key, so the JSON itself is the key; hashing it
+    # again would cost time and hide the device name from invalidate_location_cache
+    return json.dumps(key_data, sort_keys=True, default=str)
 
 def cached_query(cache_instance: PerformanceCache, ttl: Optional[int] = None):
     """
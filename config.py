@@ -13,6 +13,10 @@ class Config:
     # iCloud Configuration
     ICLOUD_EMAIL = os.environ.get('ICLOUD_EMAIL', '')
     ICLOUD_PASSWORD = os.environ.get('ICLOUD_PASSWORD', '')
+    # pyicloud keeps its cookie jar and session token here so restarts resume the session.
+    # These are live iCloud credentials, so the default is a per-user path outside the checkout
+    ICLOUD_COOKIE_DIR = os.path.expanduser(os.environ.get(
+        'ICLOUD_COOKIE_DIR', os.path.join('~', '.local', 'share', 'itrax', 'icloud_session')))
     
     # User Authentication
     USERS = {
@@ -28,6 +32,11 @@ class Config:
     GEOCODING_CACHE_HOURS = int(os.environ.get('GEOCODING_CACHE_HOURS', 24))
     GEOCODING_CACHE_SIZE = int(os.environ.get('GEOCODING_CACHE_SIZE', 1000))
     GEOCODING_MAX_PROVIDERS = int(os.environ.get('GEOCODING_MAX_PROVIDERS', 3))
+    GEOCODING_DISK_CACHE_DIR = os.environ.get('GEOCODING_DISK_CACHE_DIR', 'geocode_cache')
+    GEOCODING_DISK_CACHE_DAYS = int(os.environ.get('GEOCODING_DISK_CACHE_DAYS', 30))
+    # Point at a self-hosted Nominatim (e.g. localhost:8080 with scheme http) to lift the 1 req/sec limit
+    NOMINATIM_DOMAIN = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+    NOMINATIM_SCHEME = os.environ.get('NOMINATIM_SCHEME', 'https')
     
     # File Paths
     LOCATION_FILE = "iphone_locations_history.json"  # For migration purposes
@@ -45,6 +54,8 @@ class Config:
     DATABASE_USER = os.environ.get('DB_USER', 'icloud_app')
     DATABASE_PASSWORD = os.environ.get('DB_PASSWORD', '')
     DATABASE_NAME = os.environ.get('DB_NAME', 'icloud_tracker')
+    DATABASE_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DATABASE_DRIVER = os.environ.get('ITRAX_DB_DRIVER', 'pymysql').lower()  # pymysql or mysqlclient
     DATABASE_CLEANUP_DAYS = int(os.environ.get('DATABASE_CLEANUP_DAYS', 30))
     DATABASE_BACKUP_RETENTION = int(os.environ.get('DATABASE_BACKUP_RETENTION', 5))
     DATABASE_BACKUP_RETENTION_DAYS = int(os.environ.get('DATABASE_BACKUP_RETENTION_DAYS', 14))
@@ -1,20 +1,160 @@
-import pymysql
+from config import Config
+
+# DB-API driver: PyMySQL (pure Python, default) or mysqlclient (libmysqlclient C extension)
+if Config.DATABASE_DRIVER == 'mysqlclient':
+    import MySQLdb as db_driver
+    import MySQLdb.cursors
+else:
+    import pymysql as db_driver
+    import pymysql.cursors
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import hashlib
+import hmac
 import json
 import logging
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from config import Config
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
 import os
+import queue
+import threading
+import atexit
 import pytz
+from cachetools import TTLCache
 from cache import location_cache, dashboard_cache, cached_query, QueryTimer
 
 logger = logging.getLogger(__name__)
 
+# Argon2id with the library's recommended parameters
+_password_hasher = PasswordHasher()
+
+# Timezone choices offered on the settings page, grouped by region
+_TIMEZONE_GROUPS = MappingProxyType({
+    'US & Canada': [
+        ('America/New_York', 'Eastern Time'),
+        ('America/Chicago', 'Central Time'), 
+        ('America/Denver', 'Mountain Time'),
+        ('America/Phoenix', 'Arizona Time'),
+        ('America/Los_Angeles', 'Pacific Time'),
+        ('America/Anchorage', 'Alaska Time'),
+        ('Pacific/Honolulu', 'Hawaii Time'),
+        ('America/Toronto', 'Toronto'),
+        ('America/Vancouver', 'Vancouver')
+    ],
+    'Europe': [
+        ('Europe/London', 'London'),
+        ('Europe/Paris', 'Paris'),
+        ('Europe/Berlin', 'Berlin'),
+        ('Europe/Rome', 'Rome'),
+        ('Europe/Madrid', 'Madrid'),
+        ('Europe/Amsterdam', 'Amsterdam'),
+        ('Europe/Zurich', 'Zurich'),
+        ('Europe/Moscow', 'Moscow')
+    ],
+    'Asia Pacific': [
+        ('Asia/Tokyo', 'Tokyo'),
+        ('Asia/Shanghai', 'Shanghai'),
+        ('Asia/Singapore', 'Singapore'),
+        ('Asia/Hong_Kong', 'Hong Kong'),
+        ('Asia/Seoul', 'Seoul'),
+        ('Asia/Kolkata', 'India'),
+        ('Australia/Sydney', 'Sydney'),
+        ('Australia/Melbourne', 'Melbourne')
+    ],
+    'Other': [
+        ('UTC', 'UTC/GMT'),
+        ('America/Sao_Paulo', 'São Paulo'),
+        ('Africa/Cairo', 'Cairo'),
+        ('Africa/Johannesburg', 'Johannesburg')
+    ]
+})
+
+_NOTIFICATIONS_SELECT = """
+    SELECT 
+        sn.id, sn.device_name, sn.message, sn.timestamp, sn.is_read, sn.read_at, 
+        sn.read_by, sn.notification_type, sn.priority, sn.event_type,
+        sn.geofence_name, sn.rule_name
+    FROM sent_notifications sn
+"""
+
+_ALL_NOTIFICATIONS_QUERY = _NOTIFICATIONS_SELECT + """
+    ORDER BY sn.timestamp DESC
+    LIMIT %s
+"""
+
+_UNREAD_NOTIFICATIONS_QUERY = _NOTIFICATIONS_SELECT + """
+    WHERE sn.is_read = FALSE
+    ORDER BY sn.timestamp DESC
+    LIMIT %s
+"""
+
+class PooledConnection:
+    """Proxy around a driver connection that goes back to its pool on context exit"""
+    
+    def __init__(self, pool: 'ConnectionPool', conn):
+        self._pool = pool
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._pool.release(self._conn, failed=exc_type is not None)
+
+class ConnectionPool:
+    """Small thread-safe pool of persistent MariaDB connections.
+    
+    Reusing a session skips the TCP connect + authentication handshake that
+    every query used to pay, and keeps per-session server state (parsed
+    statements, session variables) warm across calls.
+    """
+    
+    def __init__(self, db_config: Dict, max_size: int = 10):
+        self.db_config = db_config
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+    
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return db_driver.connect(**self.db_config)
+        
+        try:
+            # PyMySQL reconnects here on its own; mysqlclient raises instead
+            conn.ping()
+            return conn
+        except db_driver.Error:
+            conn.close()
+            return db_driver.connect(**self.db_config)
+    
+    def release(self, conn, failed: bool = False):
+        if not conn.open:
+            return
+        if failed:
+            try:
+                conn.rollback()
+            except db_driver.Error:
+                conn.close()
+                return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
 class Database:
     def __init__(self, db_config: Dict = None):
         """Initialize database connection"""
+        self.device_stats_enabled = False
+        self.address_geom_column = False
+        self.address_geom_indexed = False
+        self.address_len_enabled = False
         if db_config is None:
             # Default MariaDB configuration
             self.db_config = {
@@ -24,16 +164,33 @@ class Database:
                 'password': os.getenv('DB_PASSWORD', ''),
                 'database': os.getenv('DB_NAME', 'icloud_tracker'),
                 'charset': 'utf8mb4',
-                'cursorclass': pymysql.cursors.DictCursor,
+                'cursorclass': db_driver.cursors.DictCursor,
                 'autocommit': True
             }
         else:
             self.db_config = db_config
             # Ensure DictCursor is always used
-            self.db_config['cursorclass'] = pymysql.cursors.DictCursor
+            self.db_config['cursorclass'] = db_driver.cursors.DictCursor
+        
+        self.pool = ConnectionPool(self.db_config, max_size=Config.DATABASE_POOL_SIZE)
+        
+        # log_message only enqueues; a background thread writes the rows in batches
+        self._log_queue = queue.Queue(maxsize=10_000)
+        self._log_writer = None
+        self._log_lock = threading.Lock()
+        self.dropped_log_count = 0
+        
+        # Resolved addresses keyed by coordinates rounded to ~11m, shared by pool threads
+        self._addr_mem = TTLCache(maxsize=100_000, ttl=3600)
+        self._addr_mem_lock = threading.RLock()
+        
+        # device_name -> nickname for devices that have one, loaded by reload_nicknames
+        self._nick_cache: Optional[Dict[str, str]] = None
+        self._nick_lock = threading.Lock()
         
         self.init_database()
         self.init_default_admin()
+        self.reload_nicknames()
     
     def _convert_timestamp_for_mysql(self, timestamp_str: str) -> str:
         """Convert timezone-aware timestamp to MySQL-compatible format"""
@@ -68,14 +225,26 @@ class Database:
             return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
     
     def get_connection(self):
-        """Get a database connection with dictionary cursor"""
+        """Get a pooled database connection with dictionary cursor"""
         try:
-            conn = pymysql.connect(**self.db_config)
-            return conn
+            return PooledConnection(self.pool, self.pool.acquire())
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             raise
     
+    def _fetch_streamed(self, conn, query: str, params=None) -> List[Dict]:
+        """Run a read query on an unbuffered cursor and collect rows as they arrive.
+        
+        Rows are pulled off the wire one at a time instead of being buffered by the
+        driver and then copied into a second list.
+        """
+        cursor = conn.cursor(db_driver.cursors.SSDictCursor)
+        try:
+            cursor.execute(query, params)
+            return [row for row in cursor]
+        finally:
+            cursor.close()
+    
     def init_database(self):
         """Initialize the database with required tables"""
         try:
@@ -98,7 +267,7 @@ class Database:
                 try:
                     cursor.execute("""ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT FALSE""")
                     cursor.execute("""ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT TRUE""")
-                except pymysql.Error:
+                except db_driver.Error:
                     # Columns already exist, which is fine
                     pass
                 
@@ -154,6 +323,50 @@ class Database:
                     FOREIGN KEY (device_id) REFERENCES devices(id) ON DELETE CASCADE
                 ) ENGINE=InnoDB""")
                 
+                # Per-device summary of locations, kept current by triggers so device
+                # listings don't have to aggregate the whole locations table
+                cursor.execute("""CREATE TABLE IF NOT EXISTS device_stats (
+                    device_name VARCHAR(255) PRIMARY KEY,
+                    location_count BIGINT NOT NULL DEFAULT 0,
+                    last_seen TIMESTAMP NULL
+                ) ENGINE=InnoDB""")
+                cursor.execute("SELECT COUNT(*) AS count FROM device_stats")
+                needs_backfill = cursor.fetchone()['count'] == 0
+                
+                try:
+                    cursor.execute("""
+                        CREATE TRIGGER IF NOT EXISTS trg_locations_stats_insert
+                        AFTER INSERT ON locations FOR EACH ROW
+                        INSERT INTO device_stats (device_name, location_count, last_seen)
+                        VALUES (NEW.device_name, 1, NEW.timestamp)
+                        ON DUPLICATE KEY UPDATE
+                            location_count = location_count + 1,
+                            last_seen = GREATEST(COALESCE(last_seen, NEW.timestamp), NEW.timestamp)
+                    """)
+                    cursor.execute("""
+                        CREATE TRIGGER IF NOT EXISTS trg_locations_stats_delete
+                        AFTER DELETE ON locations FOR EACH ROW
+                        UPDATE device_stats
+                        SET location_count = GREATEST(location_count - 1, 0)
+                        WHERE device_name = OLD.device_name
+                    """)
+                    
+                    if needs_backfill:
+                        cursor.execute("""
+                            INSERT INTO device_stats (device_name, location_count, last_seen)
+                            SELECT device_name, COUNT(*), MAX(timestamp)
+                            FROM locations
+                            GROUP BY device_name
+                            ON DUPLICATE KEY UPDATE
+                                location_count = VALUES(location_count),
+                                last_seen = VALUES(last_seen)
+                        """)
+                    self.device_stats_enabled = True
+                except db_driver.Error as e:
+                    # Creating triggers needs the TRIGGER privilege (and SUPER with binlog on)
+                    logger.warning(f"device_stats triggers unavailable, falling back to aggregate queries: {e}")
+                    self.device_stats_enabled = False
+                
                 # Add performance optimized indexes for GPS logs queries (without function-based indexes)
                 try:
                     cursor.execute("""CREATE INDEX IF NOT EXISTS idx_gps_logs_performance 
@@ -175,6 +388,18 @@ class Database:
                     INDEX idx_valid (is_valid)
                 ) ENGINE=InnoDB""")
                 
+                # Single-row pointer to the current iCloud session (only one is ever valid)
+                cursor.execute("""CREATE TABLE IF NOT EXISTS singleton_state (
+                    id TINYINT PRIMARY KEY,
+                    current_session_id INT NULL
+                ) ENGINE=InnoDB""")
+                
+                # Seed the pointer from existing sessions on upgraded databases
+                cursor.execute("""
+                    INSERT IGNORE INTO singleton_state (id, current_session_id)
+                    SELECT 1, MAX(id) FROM sessions WHERE is_valid = TRUE
+                """)
+                
                 # Logs table
                 cursor.execute("""CREATE TABLE IF NOT EXISTS logs (
                     id BIGINT AUTO_INCREMENT PRIMARY KEY,
@@ -279,10 +504,27 @@ class Database:
                     # Make foreign keys nullable for system notifications
                     cursor.execute("""ALTER TABLE sent_notifications MODIFY COLUMN rule_id INT DEFAULT NULL""")
                     cursor.execute("""ALTER TABLE sent_notifications MODIFY COLUMN geofence_id INT DEFAULT NULL""")
-                except pymysql.Error:
+                except db_driver.Error:
                     # Columns already exist or modification not needed, which is fine
                     pass
                 
+                # Denormalized geofence/rule names so notification reads need no joins
+                try:
+                    cursor.execute("""ALTER TABLE sent_notifications 
+                                     ADD COLUMN geofence_name VARCHAR(255) NULL,
+                                     ADD COLUMN rule_name VARCHAR(255) NULL""")
+                    # One-time backfill for rows written before the columns existed
+                    cursor.execute("""
+                        UPDATE sent_notifications sn
+                        LEFT JOIN geofences g ON sn.geofence_id = g.id
+                        LEFT JOIN notification_rules nr ON sn.rule_id = nr.id
+                        SET sn.geofence_name = g.name, sn.rule_name = nr.name
+                        WHERE sn.geofence_id IS NOT NULL OR sn.rule_id IS NOT NULL
+                    """)
+                except db_driver.Error:
+                    # Columns already exist, which is fine
+                    pass
+                
                 # Bookmarks table
                 cursor.execute("""CREATE TABLE IF NOT EXISTS bookmarks (
                     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -312,6 +554,63 @@ class Database:
                     INDEX idx_expires (expires_at)
                 ) ENGINE=InnoDB""")
                 
+                # Nearby lookups range-scan latitude and filter longitude/expiry from the index
+                try:
+                    cursor.execute("""CREATE INDEX IF NOT EXISTS idx_address_cache_lookup
+                                     ON address_cache (latitude, longitude, expires_at)""")
+                except Exception as idx_error:
+                    logger.debug(f"Index creation note (may already exist): {idx_error}")
+                
+                # POINT(longitude, latitude) copy of the coordinates with an R-tree index,
+                # so nearby lookups are a 2D index probe instead of a latitude range scan
+                try:
+                    cursor.execute("""
+                        SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'address_cache'
+                        AND COLUMN_NAME = 'geom'
+                    """)
+                    if cursor.fetchone()['count'] == 0:
+                        cursor.execute("ALTER TABLE address_cache ADD COLUMN geom POINT NULL")
+                        self.address_geom_column = True
+                        cursor.execute("UPDATE address_cache SET geom = POINT(longitude, latitude)")
+                        # SPATIAL indexes require NOT NULL columns
+                        cursor.execute("ALTER TABLE address_cache MODIFY geom POINT NOT NULL")
+                    self.address_geom_column = True
+                    cursor.execute("""CREATE SPATIAL INDEX IF NOT EXISTS idx_address_geom
+                                     ON address_cache (geom)""")
+                    self.address_geom_indexed = True
+                except db_driver.Error as e:
+                    logger.warning(f"Spatial address index unavailable, using coordinate range lookups: {e}")
+                
+                # Byte length of each address, kept by triggers, so cache size stats can be
+                # summed from a narrow index instead of reading every TEXT value
+                try:
+                    cursor.execute("""
+                        SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'address_cache'
+                        AND COLUMN_NAME = 'addr_len'
+                    """)
+                    needs_backfill = cursor.fetchone()['count'] == 0
+                    if needs_backfill:
+                        cursor.execute("ALTER TABLE address_cache ADD COLUMN addr_len SMALLINT UNSIGNED NULL")
+                    cursor.execute("""
+                        CREATE TRIGGER IF NOT EXISTS trg_address_cache_len_insert
+                        BEFORE INSERT ON address_cache FOR EACH ROW
+                        SET NEW.addr_len = LENGTH(NEW.address)
+                    """)
+                    cursor.execute("""
+                        CREATE TRIGGER IF NOT EXISTS trg_address_cache_len_update
+                        BEFORE UPDATE ON address_cache FOR EACH ROW
+                        SET NEW.addr_len = LENGTH(NEW.address)
+                    """)
+                    if needs_backfill:
+                        cursor.execute("UPDATE address_cache SET addr_len = LENGTH(address)")
+                    cursor.execute("""CREATE INDEX IF NOT EXISTS idx_address_cache_expires_len
+                                     ON address_cache (expires_at, addr_len)""")
+                    self.address_len_enabled = True
+                except db_driver.Error as e:
+                    logger.warning(f"address_cache length tracking unavailable: {e}")
+                
                 # Cached top locations table for scheduled updates
                 cursor.execute("""CREATE TABLE IF NOT EXISTS cached_top_locations (
                     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -401,59 +700,57 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Use bulk operations for better performance
-                device_updates = []
-                device_names = set()
-                
-                for location in location_data:
-                    device_name = location['device_name']
-                    timestamp = location['timestamp']
-                    device_names.add(device_name)
-                    
-                    # Convert timestamp to MySQL-compatible format
-                    mysql_timestamp = self._convert_timestamp_for_mysql(timestamp)
-                    
-                    # Prepare device update with converted timestamp
-                    device_updates.append((device_name, mysql_timestamp, device_name))
-                
-                # Ensure devices exist or are updated
-                for device_name, mysql_timestamp, _ in device_updates:
-                    cursor.execute("""
-                        INSERT INTO devices (device_name, last_seen) 
-                        VALUES (%s, %s) 
-                        ON DUPLICATE KEY UPDATE last_seen = %s
-                    """, (device_name, mysql_timestamp, mysql_timestamp))
+                # Convert each timestamp once; the device upsert and the location
+                # insert both need the MySQL form
+                mysql_timestamps = [self._convert_timestamp_for_mysql(location['timestamp'])
+                                    for location in location_data]
+                device_updates = [(location['device_name'], mysql_timestamp)
+                                  for location, mysql_timestamp in zip(location_data, mysql_timestamps)]
+                device_names = {device_name for device_name, _ in device_updates}
+                
+                # One transaction for the whole poll: with autocommit on, every
+                # statement would otherwise pay its own commit
+                conn.begin()
+                
+                # Ensure devices exist or are updated; VALUES holds only placeholders
+                # so PyMySQL rewrites executemany into a single multi-row INSERT
+                cursor.executemany("""
+                    INSERT INTO devices (device_name, last_seen) 
+                    VALUES (%s, %s) 
+                    ON DUPLICATE KEY UPDATE last_seen = VALUES(last_seen)
+                """, device_updates)
                     
                 logger.debug(f"Processed {len(device_updates)} device updates")
                 
-                # Fetch active status for devices to decide recording behavior
+                # Fetch ids and active status for devices to decide recording behavior
+                device_ids = {}
                 active_map = {}
-                if device_names:
-                    placeholders = ','.join(['%s'] * len(device_names))
-                    cursor.execute(f"""
-                        SELECT device_name, is_active
-                        FROM devices
-                        WHERE device_name IN ({placeholders})
-                    """, tuple(device_names))
-                    for row in cursor.fetchall():
-                        active_map[row['device_name']] = bool(row.get('is_active', True))
-                
-                # Bulk insert locations - fixed parameter mapping with timestamp conversion
+                placeholders = ','.join(['%s'] * len(device_names))
+                cursor.execute(f"""
+                    SELECT id, device_name, is_active
+                    FROM devices
+                    WHERE device_name IN ({placeholders})
+                """, tuple(device_names))
+                for row in cursor.fetchall():
+                    device_ids[row['device_name']] = row['id']
+                    active_map[row['device_name']] = bool(row.get('is_active', True))
+                
+                # Bulk insert locations with the device ids resolved above rather than
+                # a per-row subquery, which would stop PyMySQL batching the rows
                 location_inserts = []
-                for location in location_data:
+                for location, mysql_timestamp in zip(location_data, mysql_timestamps):
                     device_name = location['device_name']
-                    mysql_timestamp = self._convert_timestamp_for_mysql(location['timestamp'])
                     
                     # Skip recording for devices explicitly marked inactive
                     if device_name in active_map and active_map[device_name] is False:
                         continue
                     
                     location_inserts.append((
-                        device_name,  # for device_id subquery
-                        device_name,  # device_name
+                        device_ids.get(device_name),
+                        device_name,
                         location['latitude'],
                         location['longitude'],
-                        mysql_timestamp,  # converted timestamp
+                        mysql_timestamp,
                         location.get('accuracy'),
                         location.get('battery_level'),
                         location.get('is_charging', False)
@@ -462,10 +759,7 @@ class Database:
                 if location_inserts:
                     cursor.executemany("""
                         INSERT INTO locations (device_id, device_name, latitude, longitude, timestamp, accuracy, battery_level, is_charging)
-                        VALUES (
-                            (SELECT id FROM devices WHERE device_name = %s LIMIT 1),
-                            %s, %s, %s, %s, %s, %s, %s
-                        )
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     """, location_inserts)
                 
                 conn.commit()
@@ -506,6 +800,8 @@ class Database:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM locations WHERE device_name = %s", (device_name,))
                 deleted = cursor.rowcount
+                # No rows left, so last_seen in the summary is stale too
+                cursor.execute("DELETE FROM device_stats WHERE device_name = %s", (device_name,))
                 logger.info(f"Deleted {deleted} locations for device {device_name}")
                 return deleted
         except Exception as e:
@@ -560,6 +856,64 @@ class Database:
             logger.error(f"Failed to get locations: {e}")
             return []
     
+    def get_location_groups(self, device_name: str, since: Optional[str] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        """Aggregate a device's locations into ~110m coordinate cells, busiest first.
+        
+        Grouping runs in MariaDB off the (device_name, timestamp, latitude, longitude)
+        index, so only one row per cell comes back instead of every location.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                query = """
+                    SELECT ROUND(latitude, 3) AS lat_cell, ROUND(longitude, 3) AS lng_cell,
+                           AVG(latitude) AS latitude, AVG(longitude) AS longitude,
+                           COUNT(*) AS point_count,
+                           MIN(timestamp) AS first_seen, MAX(timestamp) AS last_seen
+                    FROM locations
+                    WHERE device_name = %s
+                """
+                params = [device_name]
+                
+                if since:
+                    query += ' AND timestamp >= %s'
+                    params.append(since)
+                
+                query += ' GROUP BY lat_cell, lng_cell ORDER BY point_count DESC'
+                if limit:
+                    query += ' LIMIT %s'
+                    params.append(limit)
+                
+                cursor.execute(query, params)
+                return list(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Failed to get location groups for {device_name}: {e}")
+            return []
+    
+    def iter_locations(self, limit: int = 10000, batch_size: int = 1000):
+        """Yield location rows from an unbuffered cursor, batch_size rows at a time.
+        
+        Used for exports, where holding every row in memory is unnecessary.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor(db_driver.cursors.SSDictCursor)
+            try:
+                cursor.execute("""
+                    SELECT l.*, d.device_type, d.is_active
+                    FROM locations l
+                    LEFT JOIN devices d ON l.device_id = d.id
+                    ORDER BY l.timestamp ASC LIMIT %s
+                """, (limit,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
+    
     def _cluster_locations(self, locations: List[Dict], distance_threshold: float = 0.0005) -> List[Dict]:
         """Cluster nearby locations to reduce pin density"""
         if not locations:
@@ -691,8 +1045,11 @@ class Database:
         
         return False
     
-    def diagnose_location_save_issues(self) -> Dict:
-        """Diagnose potential issues with location saving"""
+    def diagnose_location_save_issues(self, include_counts: bool = False) -> Dict:
+        """Diagnose potential issues with location saving.
+        
+        Row counts are only gathered when include_counts is set.
+        """
         issues = []
         info = {}
         
@@ -730,19 +1087,31 @@ class Database:
                     if 'device_name' not in columns:
                         issues.append("devices table missing device_name column")
                 
-                # Check for recent activity
+                # Check for recent activity; EXISTS stops at the first matching row
                 if 'locations' in tables:
-                    cursor.execute("SELECT COUNT(*) as count FROM locations WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 1 DAY)")
-                    recent_count = cursor.fetchone()['count']
-                    info['recent_locations_24h'] = recent_count
+                    cursor.execute("""
+                        SELECT
+                            EXISTS(SELECT 1 FROM locations LIMIT 1) AS has_any,
+                            EXISTS(SELECT 1 FROM locations
+                                   WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 1 DAY) LIMIT 1) AS has_recent
+                    """)
+                    activity = cursor.fetchone()
+                    info['has_locations'] = bool(activity['has_any'])
+                    info['has_recent_locations'] = bool(activity['has_recent'])
                     
-                    cursor.execute("SELECT COUNT(*) as count FROM locations")
-                    total_count = cursor.fetchone()['count']
-                    info['total_locations'] = total_count
+                    if include_counts:
+                        cursor.execute("SELECT COUNT(*) as count FROM locations WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 1 DAY)")
+                        info['recent_locations_24h'] = cursor.fetchone()['count']
+                        
+                        if self.device_stats_enabled:
+                            cursor.execute("SELECT COALESCE(SUM(location_count), 0) as count FROM device_stats")
+                        else:
+                            cursor.execute("SELECT COUNT(*) as count FROM locations")
+                        info['total_locations'] = int(cursor.fetchone()['count'])
                     
-                    if total_count == 0:
+                    if not activity['has_any']:
                         issues.append("No location records found in database")
-                    elif recent_count == 0:
+                    elif not activity['has_recent']:
                         issues.append("No recent location records (last 24 hours)")
                 
                 # Test a simple insert
@@ -811,14 +1180,13 @@ class Database:
                 stats = cursor.fetchone()
                 
                 # Get device statistics
-                cursor.execute("""
+                devices = self._fetch_streamed(conn, """
                     SELECT device_name, COUNT(*) as location_count, 
                            MAX(timestamp) as last_seen
                     FROM locations 
                     GROUP BY device_name
                     ORDER BY last_seen DESC
                 """)
-                devices = list(cursor.fetchall())
                 
                 # Get address cache stats
                 try:
@@ -851,9 +1219,17 @@ class Database:
         """Get all tracked devices"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                if self.device_stats_enabled:
+                    # One indexed lookup per device instead of aggregating all locations
+                    return self._fetch_streamed(conn, """
+                        SELECT d.*, COALESCE(ds.location_count, 0) as location_count,
+                               ds.last_seen as last_location
+                        FROM devices d
+                        LEFT JOIN device_stats ds ON ds.device_name = d.device_name
+                        ORDER BY d.last_seen DESC
+                    """)
                 
-                cursor.execute("""
+                return self._fetch_streamed(conn, """
                     SELECT d.*, COUNT(l.id) as location_count,
                            MAX(l.timestamp) as last_location
                     FROM devices d
@@ -862,8 +1238,6 @@ class Database:
                     ORDER BY d.last_seen DESC
                 """)
                 
-                return list(cursor.fetchall())
-                
         except Exception as e:
             logger.error(f"Failed to get devices: {e}")
             return []
@@ -873,6 +1247,7 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                conn.begin()
                 
                 # Invalidate old sessions
                 cursor.execute('UPDATE sessions SET is_valid = FALSE')
@@ -883,6 +1258,13 @@ class Database:
                     VALUES (%s, %s)
                 """, (session_data, expires_at))
                 
+                # Point the singleton at the new session in the same transaction
+                cursor.execute("""
+                    INSERT INTO singleton_state (id, current_session_id)
+                    VALUES (1, LAST_INSERT_ID())
+                    ON DUPLICATE KEY UPDATE current_session_id = VALUES(current_session_id)
+                """)
+                
                 conn.commit()
                 logger.info("Session saved to database")
                 
@@ -898,7 +1280,8 @@ class Database:
                 cursor.execute("""
                     UPDATE sessions 
                     SET is_valid = FALSE 
-                    WHERE expires_at IS NOT NULL 
+                    WHERE is_valid = TRUE
+                    AND expires_at IS NOT NULL 
                     AND expires_at <= NOW()
                 """)
                 
@@ -911,18 +1294,43 @@ class Database:
         except Exception as e:
             logger.error(f"Failed to cleanup expired sessions: {e}")
     
+    def session_verified_within(self, seconds: int) -> bool:
+        """Whether the current iCloud session was saved in the last `seconds` seconds
+        
+        The tracker saves the session right after a successful device probe. The
+        age is computed on the server, whose clock filled in created_at.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT 1
+                    FROM singleton_state st
+                    JOIN sessions s ON s.id = st.current_session_id
+                    WHERE st.id = 1
+                    AND s.is_valid = TRUE
+                    AND s.created_at > NOW() - INTERVAL %s SECOND
+                """, (seconds,))
+                return cursor.fetchone() is not None
+                
+        except Exception as e:
+            logger.error(f"Failed to check session verification time: {e}")
+            return False
+    
     def get_valid_session(self) -> Optional[str]:
         """Get the most recent valid session that hasn't expired"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
+                # Primary-key lookup through the singleton pointer, no sort needed
                 cursor.execute("""
-                    SELECT session_data FROM sessions 
-                    WHERE is_valid = TRUE 
-                    AND (expires_at IS NULL OR expires_at > NOW())
-                    ORDER BY created_at DESC 
-                    LIMIT 1
+                    SELECT s.session_data
+                    FROM singleton_state st
+                    JOIN sessions s ON s.id = st.current_session_id
+                    WHERE st.id = 1
+                    AND s.is_valid = TRUE 
+                    AND (s.expires_at IS NULL OR s.expires_at > NOW())
                 """)
                 
                 result = cursor.fetchone()
@@ -933,62 +1341,126 @@ class Database:
             return None
     
     def log_message(self, level: str, message: str, source: str = "application"):
-        """Log a message to the database"""
+        """Queue a message to be written to the logs table by the background writer"""
+        if self._log_writer is None:
+            self._start_log_writer()
+        
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO logs (level, message, source)
-                    VALUES (%s, %s, %s)
-                """, (level, message, source))
-                
-                conn.commit()
-                
-        except Exception as e:
-            logger.error(f"Failed to log message to database: {e}")
+            self._log_queue.put_nowait((level, message, source))
+        except queue.Full:
+            with self._log_lock:
+                self.dropped_log_count += 1
+    
+    def _start_log_writer(self):
+        """Start the log writer thread on first use"""
+        with self._log_lock:
+            if self._log_writer is not None:
+                return
+            self._log_writer = threading.Thread(target=self._run_log_writer, daemon=True)
+            self._log_writer.start()
+            atexit.register(self.flush_logs)
+    
+    def _run_log_writer(self):
+        """Drain queued log rows every 100 ms"""
+        while True:
+            self.flush_logs()
+            time.sleep(0.1)
     
-    def cleanup_old_data(self, days_to_keep: int = 30):
-        """Clean up old location data"""
+    def flush_logs(self, batch_size: int = 500):
+        """Write all queued log rows, up to batch_size rows per transaction"""
+        while True:
+            rows = []
+            while len(rows) < batch_size:
+                try:
+                    rows.append(self._log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            if not rows:
+                return
+            
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany("""
+                        INSERT INTO logs (level, message, source)
+                        VALUES (%s, %s, %s)
+                    """, rows)
+                    conn.commit()
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} log messages to database: {e}")
+    
+    def _delete_in_batches(self, conn, cursor, query: str, params: tuple, batch_size: int = 5000) -> int:
+        """Run a DELETE ... LIMIT repeatedly, committing each batch so row locks are held briefly"""
+        # Fail fast on lock waits so a stuck batch is retried instead of blocking inserts
+        cursor.execute("SET SESSION innodb_lock_wait_timeout = 5")
+        
+        deleted_total = 0
+        retries = 0
+        try:
+            while True:
+                try:
+                    cursor.execute(f"{query} LIMIT %s", params + (batch_size,))
+                    conn.commit()
+                except db_driver.OperationalError as e:
+                    # 1205 = lock wait timeout exceeded; back off before retrying
+                    if e.args and e.args[0] == 1205 and retries < 3:
+                        retries += 1
+                        conn.rollback()
+                        logger.debug(f"Lock wait timeout during batched delete, retrying ({retries}/3)")
+                        time.sleep(0.5 * 2 ** retries)
+                        continue
+                    raise
+                
+                retries = 0
+                deleted_total += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+        finally:
+            # The connection goes back to the pool, so don't leak the short timeout
+            cursor.execute("SET SESSION innodb_lock_wait_timeout = DEFAULT")
+        return deleted_total
+    
+    def cleanup_old_data(self, days_to_keep: int = 30) -> int:
+        """Clean up old location data and return the number of locations deleted"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Delete old locations
-                cursor.execute("""
+                # Delete old locations in small batches so ingestion isn't blocked
+                deleted_count = self._delete_in_batches(conn, cursor, """
                     DELETE FROM locations 
                     WHERE timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
                 """, (days_to_keep,))
                 
-                deleted_count = cursor.rowcount
-                
                 # Delete old logs
-                cursor.execute("""
+                deleted_logs = self._delete_in_batches(conn, cursor, """
                     DELETE FROM logs 
                     WHERE timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
                 """, (days_to_keep,))
                 
-                deleted_logs = cursor.rowcount
-                
-                conn.commit()
-                
                 if deleted_count > 0 or deleted_logs > 0:
                     logger.info(f"Cleaned up {deleted_count} old locations and {deleted_logs} old logs")
+                return deleted_count
                 
         except Exception as e:
             logger.error(f"Failed to cleanup old data: {e}")
+            return 0
     
     def backup_database(self, backup_path: str = None):
-        """Create a backup of the database using mysqldump"""
+        """Create a gzip-compressed backup of the database using mysqldump"""
         if not backup_path:
             # Create backups directory if it doesn't exist
-            import os
             os.makedirs("backups", exist_ok=True)
             
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = f"backups/itrax_backup_{timestamp}.sql"
+            backup_path = f"backups/itrax_backup_{timestamp}.sql.gz"
+        elif not backup_path.endswith('.gz'):
+            backup_path += '.gz'
         
         try:
+            import gzip
+            import shutil
             import subprocess
             
             cmd = [
@@ -998,26 +1470,41 @@ class Database:
                 f"--user={self.db_config['user']}",
                 f"--password={self.db_config['password']}",
                 '--single-transaction',
+                '--quick',
                 '--routines',
                 '--triggers',
                 self.db_config['database']
             ]
             
-            with open(backup_path, 'w') as f:
-                subprocess.run(cmd, stdout=f, check=True)
+            # Compress while mysqldump is still producing output instead of
+            # writing the raw SQL to disk first
+            with gzip.open(backup_path, 'wb', compresslevel=6) as f:
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+                try:
+                    shutil.copyfileobj(proc.stdout, f, length=1 << 20)
+                except BaseException:
+                    # Don't leave mysqldump running against a closed pipe
+                    proc.kill()
+                    proc.wait()
+                    raise
+                finally:
+                    proc.stdout.close()
+                if proc.wait() != 0:
+                    raise RuntimeError(f"mysqldump exited with status {proc.returncode}")
             
             logger.info(f"Database backed up to {backup_path}")
             return backup_path
         except Exception as e:
             logger.error(f"Failed to backup database: {e}")
+            if os.path.exists(backup_path):
+                os.remove(backup_path)
             return None
     
     def create_user(self, username: str, password: str, is_admin: bool = False) -> bool:
         """Create a new user with hashed password"""
-        import hashlib
         try:
             # Hash the password
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            password_hash = _password_hasher.hash(password)
             
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -1033,26 +1520,43 @@ class Database:
     
     def verify_user(self, username: str, password: str) -> bool:
         """Verify user credentials against database"""
-        import hashlib
         try:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT id FROM users 
-                    WHERE username = %s AND password_hash = %s
-                """, (username, password_hash))
+                    SELECT password_hash FROM users 
+                    WHERE username = %s AND is_active = TRUE
+                """, (username,))
                 user = cursor.fetchone()
+                if not user:
+                    return False
+                
+                stored_hash = user['password_hash']
+                new_hash = None
+                if stored_hash.startswith('$argon2'):
+                    try:
+                        _password_hasher.verify(stored_hash, password)
+                    except (VerificationError, InvalidHashError):
+                        return False
+                    if _password_hasher.check_needs_rehash(stored_hash):
+                        new_hash = _password_hasher.hash(password)
+                else:
+                    # Legacy unsalted SHA-256 hash; upgrade it while we have the password
+                    legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+                    if not hmac.compare_digest(stored_hash, legacy_hash):
+                        return False
+                    new_hash = _password_hasher.hash(password)
                 
-                if user:
-                    # Update last login time
+                if new_hash:
                     cursor.execute("""
-                        UPDATE users SET last_login = CURRENT_TIMESTAMP 
+                        UPDATE users SET password_hash = %s, last_login = CURRENT_TIMESTAMP 
                         WHERE username = %s
+                    """, (new_hash, username))
+                else:
+                    cursor.execute("""
+                        UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = %s
                     """, (username,))
-                    return True
-                return False
+                return True
         except Exception as e:
             logger.error(f"Failed to verify user {username}: {e}")
             return False
@@ -1091,15 +1595,22 @@ class Database:
         except Exception as e:
             logger.error(f"Failed to initialize default admin: {e}")
     
-    def get_all_users(self) -> List[Dict]:
-        """Get all users from database"""
+    def get_all_users(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Get all users from database, optionally one page at a time"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, username, is_admin, is_active, created_at, last_login
-                    FROM users ORDER BY created_at DESC
-                """)
+                if limit is None:
+                    cursor.execute("""
+                        SELECT id, username, is_admin, is_active, created_at, last_login
+                        FROM users ORDER BY created_at DESC
+                    """)
+                else:
+                    cursor.execute("""
+                        SELECT id, username, is_admin, is_active, created_at, last_login
+                        FROM users ORDER BY created_at DESC
+                        LIMIT %s OFFSET %s
+                    """, (limit, offset))
                 return cursor.fetchall()
         except Exception as e:
             logger.error(f"Failed to get all users: {e}")
@@ -1153,9 +1664,8 @@ class Database:
     
     def change_user_password(self, username: str, new_password: str) -> bool:
         """Change user password"""
-        import hashlib
         try:
-            password_hash = hashlib.sha256(new_password.encode()).hexdigest()
+            password_hash = _password_hasher.hash(new_password)
             
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -1177,11 +1687,16 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                # Names are copied in at insert time so reads don't have to join
                 cursor.execute("""
                     INSERT INTO sent_notifications 
-                    (rule_id, device_name, geofence_id, event_type, message, notification_type, priority)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (rule_id, device_name, geofence_id, event_type, message, notification_type, priority))
+                    (rule_id, device_name, geofence_id, event_type, message, notification_type, priority,
+                     geofence_name, rule_name)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s,
+                            (SELECT name FROM geofences WHERE id = %s),
+                            (SELECT name FROM notification_rules WHERE id = %s))
+                """, (rule_id, device_name, geofence_id, event_type, message, notification_type, priority,
+                      geofence_id, rule_id))
                 logger.info(f"Created {notification_type} notification for {device_name}: {message}")
                 return True
         except Exception as e:
@@ -1192,35 +1707,16 @@ class Database:
         """Get notifications for user (or all if admin)"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                where_clause = ""
-                params = []
-                
-                if unread_only:
-                    where_clause = "WHERE is_read = FALSE"
-                
                 if username:
                     # For regular users, show notifications for devices they have access to
                     # For now, show all notifications (can be refined later with device permissions)
                     pass
                 
-                query = f"""
-                    SELECT 
-                        sn.id, sn.device_name, sn.message, sn.timestamp, sn.is_read, sn.read_at, 
-                        sn.read_by, sn.notification_type, sn.priority, sn.event_type,
-                        g.name as geofence_name, nr.name as rule_name
-                    FROM sent_notifications sn
-                    LEFT JOIN geofences g ON sn.geofence_id = g.id
-                    LEFT JOIN notification_rules nr ON sn.rule_id = nr.id
-                    {where_clause}
-                    ORDER BY sn.timestamp DESC
-                    LIMIT %s
-                """
-                params.append(limit)
+                # Fixed statement text per variant instead of splicing a WHERE clause
+                query = _UNREAD_NOTIFICATIONS_QUERY if unread_only else _ALL_NOTIFICATIONS_QUERY
+                params = (limit,)
                 
-                cursor.execute(query, params)
-                return cursor.fetchall()
+                return self._fetch_streamed(conn, query, params)
         except Exception as e:
             logger.error(f"Failed to get notifications: {e}")
             return []
@@ -1286,11 +1782,10 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
+                count = self._delete_in_batches(conn, cursor, """
                     DELETE FROM sent_notifications 
                     WHERE is_read = TRUE AND timestamp < DATE_SUB(NOW(), INTERVAL %s DAY)
                 """, (days,))
-                count = cursor.rowcount
                 if count > 0:
                     logger.info(f"Cleaned up {count} old notifications")
                 return count
@@ -1479,84 +1974,80 @@ class Database:
             'refresh_interval': 300
         }
     
-    def get_available_timezones(self) -> List[Dict]:
+    def get_available_timezones(self) -> Mapping[str, List[Tuple[str, str]]]:
         """Get list of available timezones grouped by region"""
-        import pytz
-        
-        timezone_groups = {
-            'US & Canada': [
-                ('America/New_York', 'Eastern Time'),
-                ('America/Chicago', 'Central Time'), 
-                ('America/Denver', 'Mountain Time'),
-                ('America/Phoenix', 'Arizona Time'),
-                ('America/Los_Angeles', 'Pacific Time'),
-                ('America/Anchorage', 'Alaska Time'),
-                ('Pacific/Honolulu', 'Hawaii Time'),
-                ('America/Toronto', 'Toronto'),
-                ('America/Vancouver', 'Vancouver')
-            ],
-            'Europe': [
-                ('Europe/London', 'London'),
-                ('Europe/Paris', 'Paris'),
-                ('Europe/Berlin', 'Berlin'),
-                ('Europe/Rome', 'Rome'),
-                ('Europe/Madrid', 'Madrid'),
-                ('Europe/Amsterdam', 'Amsterdam'),
-                ('Europe/Zurich', 'Zurich'),
-                ('Europe/Moscow', 'Moscow')
-            ],
-            'Asia Pacific': [
-                ('Asia/Tokyo', 'Tokyo'),
-                ('Asia/Shanghai', 'Shanghai'),
-                ('Asia/Singapore', 'Singapore'),
-                ('Asia/Hong_Kong', 'Hong Kong'),
-                ('Asia/Seoul', 'Seoul'),
-                ('Asia/Kolkata', 'India'),
-                ('Australia/Sydney', 'Sydney'),
-                ('Australia/Melbourne', 'Melbourne')
-            ],
-            'Other': [
-                ('UTC', 'UTC/GMT'),
-                ('America/Sao_Paulo', 'São Paulo'),
-                ('Africa/Cairo', 'Cairo'),
-                ('Africa/Johannesburg', 'Johannesburg')
-            ]
-        }
-        
-        return timezone_groups
+        return _TIMEZONE_GROUPS
     
-    def get_device_nickname(self, device_name: str) -> str:
-        """Get device nickname or return device_name if no nickname set"""
+    def reload_nicknames(self) -> Dict[str, str]:
+        """(Re)load the in-process nickname map from the devices table"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT nickname FROM devices 
-                    WHERE device_name = %s AND nickname IS NOT NULL AND nickname != ''
-                """, (device_name,))
-                result = cursor.fetchone()
-                return result['nickname'] if result else device_name
+                    SELECT device_name, nickname FROM devices 
+                    WHERE nickname IS NOT NULL AND nickname != ''
+                """)
+                nicknames = {row['device_name']: row['nickname'] for row in cursor.fetchall()}
         except Exception as e:
-            logger.error(f"Failed to get device nickname for {device_name}: {e}")
-            return device_name
+            logger.error(f"Failed to load device nicknames: {e}")
+            return self._nick_cache or {}
+        
+        with self._nick_lock:
+            self._nick_cache = nicknames
+        return nicknames
+    
+    def _update_nickname_cache(self, device_name: str, nickname: Optional[str]):
+        with self._nick_lock:
+            if self._nick_cache is None:
+                return
+            if nickname:
+                self._nick_cache[device_name] = nickname
+            else:
+                self._nick_cache.pop(device_name, None)
+    
+    def get_device_nickname(self, device_name: str) -> str:
+        """Get device nickname or return device_name if no nickname set"""
+        nicknames = self._nick_cache
+        if nicknames is None:
+            nicknames = self.reload_nicknames()
+        return nicknames.get(device_name, device_name)
     
     def set_device_nickname(self, device_name: str, nickname: str) -> bool:
         """Set or update a device nickname"""
+        return self.set_device_nicknames_bulk([(device_name, nickname)])
+    
+    def set_device_nicknames_bulk(self, items: List[Tuple[str, str]]) -> bool:
+        """Set or update nicknames for many devices in one transaction"""
+        # Skip devices whose nickname is already what's being saved
+        nicknames = self._nick_cache
+        if nicknames is not None:
+            items = [(device_name, nickname) for device_name, nickname in items
+                     if nicknames.get(device_name) != nickname]
+        
+        if not items:
+            return True
+        
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                conn.begin()
                 
-                # First, ensure the device exists in the devices table
-                cursor.execute("""
-                    INSERT INTO devices (device_name, nickname, first_seen, last_seen) 
-                    VALUES (%s, %s, NOW(), NOW())
+                # VALUES holds only placeholders so PyMySQL rewrites executemany
+                # into a single multi-row INSERT; first_seen/last_seen default to now
+                cursor.executemany("""
+                    INSERT INTO devices (device_name, nickname) 
+                    VALUES (%s, %s)
                     ON DUPLICATE KEY UPDATE 
                     nickname = VALUES(nickname), last_seen = NOW()
-                """, (device_name, nickname))
+                """, items)
                 
-                return True
+                conn.commit()
+            
+            for device_name, nickname in items:
+                self._update_nickname_cache(device_name, nickname)
+            return True
         except Exception as e:
-            logger.error(f"Failed to set nickname for device {device_name}: {e}")
+            logger.error(f"Failed to set nicknames for {len(items)} devices: {e}")
             return False
     
     def remove_device_nickname(self, device_name: str) -> bool:
@@ -1569,7 +2060,9 @@ class Database:
                     SET nickname = NULL 
                     WHERE device_name = %s
                 """, (device_name,))
-                return True
+            
+            self._update_nickname_cache(device_name, None)
+            return True
         except Exception as e:
             logger.error(f"Failed to remove nickname for device {device_name}: {e}")
             return False
@@ -1579,6 +2072,25 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                if self.device_stats_enabled:
+                    # Counts come from the trigger-maintained summary, so this only reads
+                    # one row per device instead of aggregating locations
+                    cursor.execute("""
+                        SELECT d.device_name,
+                               d.nickname,
+                               COALESCE(d.nickname, d.device_name) AS display_name,
+                               COALESCE(MAX(ds.location_count), 0) AS location_count,
+                               MAX(ds.last_seen) AS last_location,
+                               COALESCE(d.is_active, TRUE) AS is_active
+                        FROM devices d
+                        LEFT JOIN device_stats ds ON ds.device_name = d.device_name
+                        GROUP BY d.device_name, d.nickname, d.is_active
+                        ORDER BY display_name
+                    """)
+                    devices = cursor.fetchall()
+                    logger.info(f"Successfully loaded {len(devices)} devices")
+                    return devices
+                
                 # Accurate device stats with nickname, counts and last location
                 cursor.execute("""
                     SELECT d.device_name,
@@ -1603,8 +2115,7 @@ class Database:
     
     def get_device_display_name(self, device_name: str) -> str:
         """Get the display name for a device (nickname if available, otherwise device name)"""
-        nickname = self.get_device_nickname(device_name)
-        return nickname if nickname != device_name else device_name
+        return self.get_device_nickname(device_name)
     
     def get_cached_address(self, latitude: float, longitude: float, tolerance: float = 0.0005) -> Optional[str]:
         """Get cached address from database if not expired, with smart coordinate grouping
@@ -1615,34 +2126,48 @@ class Database:
             tolerance: Coordinate tolerance for grouping (default ~55 meters at equator)
         """
         try:
+            # Rows read from DECIMAL columns arrive as Decimal
+            latitude, longitude = float(latitude), float(longitude)
+            
+            key = (round(latitude, 4), round(longitude, 4))
+            with self._addr_mem_lock:
+                address = self._addr_mem.get(key)
+            if address is not None:
+                return address
+            
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # First try exact match
-                cursor.execute("""
-                    SELECT address FROM address_cache 
-                    WHERE latitude = %s AND longitude = %s 
-                    AND expires_at > NOW()
-                """, (latitude, longitude))
-                result = cursor.fetchone()
-                if result:
-                    return result['address']
-                
-                # If no exact match, try nearby coordinates within tolerance
-                cursor.execute("""
-                    SELECT address, latitude, longitude,
-                           ABS(latitude - %s) + ABS(longitude - %s) as distance
-                    FROM address_cache 
-                    WHERE ABS(latitude - %s) <= %s 
-                    AND ABS(longitude - %s) <= %s
-                    AND expires_at > NOW()
-                    ORDER BY distance
-                    LIMIT 1
-                """, (latitude, longitude, latitude, tolerance, longitude, tolerance))
+                if self.address_geom_indexed:
+                    # R-tree probe on the buffer's bounding box; an exact match sorts first
+                    cursor.execute("""
+                        SELECT address, latitude, longitude
+                        FROM address_cache 
+                        WHERE MBRContains(ST_Buffer(POINT(%s, %s), %s), geom)
+                        AND expires_at > NOW()
+                        ORDER BY ST_Distance(geom, POINT(%s, %s))
+                        LIMIT 1
+                    """, (longitude, latitude, tolerance, longitude, latitude))
+                else:
+                    # Bounding-box range so the (latitude, longitude) index is usable;
+                    # an exact match sorts first with distance 0
+                    cursor.execute("""
+                        SELECT address, latitude, longitude
+                        FROM address_cache 
+                        WHERE latitude BETWEEN %s AND %s
+                        AND longitude BETWEEN %s AND %s
+                        AND expires_at > NOW()
+                        ORDER BY POW(latitude - %s, 2) + POW(longitude - %s, 2)
+                        LIMIT 1
+                    """, (latitude - tolerance, latitude + tolerance,
+                          longitude - tolerance, longitude + tolerance,
+                          latitude, longitude))
                 
                 nearby_result = cursor.fetchone()
                 if nearby_result:
                     logger.debug(f"Using nearby cached address for {latitude},{longitude} from {nearby_result['latitude']},{nearby_result['longitude']}")
+                    with self._addr_mem_lock:
+                        self._addr_mem[key] = nearby_result['address']
                     return nearby_result['address']
                 
                 return None
@@ -1652,23 +2177,55 @@ class Database:
     
     def cache_address(self, latitude: float, longitude: float, address: str, cache_days: int = 30) -> bool:
         """Cache address in database with expiration"""
+        return self.cache_addresses_bulk([(latitude, longitude, address)], cache_days=cache_days)
+    
+    def cache_addresses_bulk(self, rows: List[Tuple[float, float, str]], cache_days: int = 30) -> bool:
+        """Cache many (latitude, longitude, address) rows with multi-row upserts in one transaction"""
+        if not rows:
+            return True
+        
+        expires_at = datetime.now() + timedelta(days=cache_days)
+        if self.address_geom_column:
+            columns = "latitude, longitude, address, expires_at, geom"
+            row_template = "(%s, %s, %s, %s, POINT(%s, %s))"
+            row_params = lambda lat, lng, addr: (lat, lng, addr, expires_at, lng, lat)
+        else:
+            columns = "latitude, longitude, address, expires_at"
+            row_template = "(%s, %s, %s, %s)"
+            row_params = lambda lat, lng, addr: (lat, lng, addr, expires_at)
+        # Kept under the 65535 placeholder limit
+        chunk_size = min(5000, 65535 // row_template.count('%s'))
+        
         try:
-            from datetime import datetime, timedelta
-            expires_at = datetime.now() + timedelta(days=cache_days)
-            
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO address_cache (latitude, longitude, address, expires_at) 
-                    VALUES (%s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE 
-                    address = VALUES(address), 
-                    geocoded_at = CURRENT_TIMESTAMP,
-                    expires_at = VALUES(expires_at)
-                """, (latitude, longitude, address, expires_at))
-                return True
+                conn.begin()
+                
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    values = ", ".join([row_template] * len(chunk))
+                    params = tuple(
+                        value
+                        for latitude, longitude, address in chunk
+                        for value in row_params(latitude, longitude, address)
+                    )
+                    cursor.execute(f"""
+                        INSERT INTO address_cache ({columns}) 
+                        VALUES {values}
+                        ON DUPLICATE KEY UPDATE 
+                        address = VALUES(address), 
+                        geocoded_at = CURRENT_TIMESTAMP,
+                        expires_at = VALUES(expires_at)
+                    """, params)
+                
+                conn.commit()
+            
+            with self._addr_mem_lock:
+                for latitude, longitude, address in rows:
+                    self._addr_mem[(round(float(latitude), 4), round(float(longitude), 4))] = address
+            return True
         except Exception as e:
-            logger.error(f"Failed to cache address for {latitude}, {longitude}: {e}")
+            logger.error(f"Failed to cache {len(rows)} addresses: {e}")
             return False
 
     def get_or_create_place_id(self, device_name: str, latitude: float, longitude: float, address: str) -> Optional[int]:
@@ -1791,9 +2348,14 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM address_cache WHERE expires_at <= NOW()")
-                deleted_count = cursor.rowcount
+                # Batched so the purge never holds a long-running lock on the cache
+                deleted_count = self._delete_in_batches(conn, cursor, """
+                    DELETE FROM address_cache 
+                    WHERE expires_at <= NOW()
+                """, ())
                 if deleted_count > 0:
+                    with self._addr_mem_lock:
+                        self._addr_mem.clear()
                     logger.info(f"Cleaned up {deleted_count} expired address cache entries")
                 return deleted_count
         except Exception as e:
@@ -1806,21 +2368,19 @@ class Database:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Get total cache entries
-                cursor.execute("SELECT COUNT(*) as total FROM address_cache")
-                total = cursor.fetchone()['total']
-                
-                # Get expired entries
-                cursor.execute("SELECT COUNT(*) as expired FROM address_cache WHERE expires_at <= NOW()")
-                expired = cursor.fetchone()['expired']
-                
-                # Get cache size
-                cursor.execute("""
-                    SELECT ROUND(SUM(LENGTH(address)) / 1024, 2) as size_kb 
+                # Totals, expired entries and size in a single pass; with addr_len
+                # this is answered from the (expires_at, addr_len) index alone
+                size_expr = "addr_len" if self.address_len_enabled else "LENGTH(address)"
+                cursor.execute(f"""
+                    SELECT COUNT(*) as total,
+                           COALESCE(SUM(expires_at <= NOW()), 0) as expired,
+                           ROUND(SUM({size_expr}) / 1024, 2) as size_kb 
                     FROM address_cache
                 """)
-                size_result = cursor.fetchone()
-                size_kb = size_result['size_kb'] if size_result['size_kb'] else 0
+                result = cursor.fetchone()
+                total = result['total']
+                expired = int(result['expired'])
+                size_kb = result['size_kb'] if result['size_kb'] else 0
                 
                 return {
                     'total_entries': total,
@@ -2070,41 +2630,67 @@ class Database:
             logger.error(f"Failed to get cached top locations: {e}")
             return {"locations": [], "cached": False}
 
-    def get_devices_needing_cache_update(self, cache_type: str) -> List[str]:
-        """Get devices that need cache updates"""
+    def _tracked_devices_sql(self) -> str:
+        """Query for the names of devices that have location rows.
+        
+        device_stats holds one row per device; without it, GROUP BY lets the planner
+        skip through the (device_name, timestamp) index instead of reading every row.
+        """
+        if self.device_stats_enabled:
+            return "SELECT device_name FROM device_stats WHERE location_count > 0"
+        return "SELECT device_name FROM locations GROUP BY device_name"
+    
+    def get_tracked_device_names(self) -> List[str]:
+        """Get names of all devices with location data"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute(self._tracked_devices_sql())
+                return [row['device_name'] for row in cursor.fetchall()]
                 
-                # Get all devices
-                cursor.execute("SELECT DISTINCT device_name FROM locations")
-                all_devices = [row['device_name'] for row in cursor.fetchall()]
-                
-                # Get devices with expired cache
-                cursor.execute("""
-                    SELECT DISTINCT device_name
-                    FROM cached_top_locations 
-                    WHERE cache_type = %s AND next_update <= NOW()
-                """, (cache_type,))
-                expired_devices = [row['device_name'] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to get tracked devices: {e}")
+            return []
+    
+    def get_all_expired_caches(self) -> List[Dict]:
+        """Get (device_name, cache_type) pairs whose top locations cache is expired or missing"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
                 
-                # Get devices without any cache
-                cursor.execute("""
-                    SELECT DISTINCT device_name
-                    FROM locations
-                    WHERE device_name NOT IN (
-                        SELECT device_name FROM cached_top_locations WHERE cache_type = %s
+                # Expired caches and devices with no cache of a type, in one round trip
+                cursor.execute(f"""
+                    SELECT device_name, cache_type
+                    FROM cached_top_locations
+                    WHERE next_update <= NOW()
+                    UNION
+                    SELECT l.device_name, t.cache_type
+                    FROM ({self._tracked_devices_sql()}) l
+                    CROSS JOIN (SELECT 'weekly' AS cache_type UNION ALL SELECT 'alltime') t
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM cached_top_locations c
+                        WHERE c.device_name = l.device_name AND c.cache_type = t.cache_type
                     )
-                """, (cache_type,))
-                uncached_devices = [row['device_name'] for row in cursor.fetchall()]
-                
-                # Combine and deduplicate
-                needs_update = list(set(expired_devices + uncached_devices))
-                return needs_update
+                    ORDER BY FIELD(cache_type, 'weekly', 'alltime'), device_name
+                """)
+                return cursor.fetchall()
                 
         except Exception as e:
             logger.error(f"Failed to get devices needing cache update: {e}")
             return []
 
+    def get_earliest_next_cache_update(self) -> Optional[datetime]:
+        """Get the soonest next_update across all cached top locations (None if nothing is cached)"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MIN(next_update) AS next_update FROM cached_top_locations")
+                row = cursor.fetchone()
+                return row['next_update'] if row else None
+                
+        except Exception as e:
+            logger.error(f"Failed to get earliest cache update time: {e}")
+            return None
+
 # Global database instance
 db = Database()
\ No newline at end of file
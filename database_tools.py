@@ -8,11 +8,23 @@ This script provides utilities for database maintenance, analysis, and migration
 import argparse
 import sys
 import getpass
-import hashlib
 from datetime import datetime, timedelta
-from database import db
+from database import db, db_driver
 from config import Config
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+def _dumps_row(row) -> bytes:
+    """Serialize one exported row; datetimes and Decimals become strings"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(row, default=str)
+    return json.dumps(row, default=str).encode()
+
 def show_statistics():
     """Display database statistics"""
     print("📊 Database Statistics")
@@ -80,9 +92,7 @@ def show_recent_locations(limit=10):
     print("=" * 40)
     
     try:
-        locations = db.get_locations(limit=limit)
-        
-        for loc in locations:
+        for loc in db.iter_locations(limit=limit, batch_size=256):
             print(f"📱 {loc['device_name']}")
             print(f"   📍 {loc['latitude']:.6f}, {loc['longitude']:.6f}")
             print(f"   ⏰ {loc['timestamp']}")
@@ -96,16 +106,9 @@ def cleanup_old_data(days=30):
     print(f"🧹 Cleaning up data older than {days} days...")
     
     try:
-        # Get count before cleanup
-        stats_before = db.get_statistics()
-        
         # Perform cleanup
-        db.cleanup_old_data(days_to_keep=days)
+        deleted = db.cleanup_old_data(days_to_keep=days)
         
-        # Get count after cleanup
-        stats_after = db.get_statistics()
-        
-        deleted = stats_before['total_locations'] - stats_after['total_locations']
         print(f"✅ Cleaned up {deleted:,} old location records")
         
     except Exception as e:
@@ -175,7 +178,8 @@ def show_logs(level="INFO", limit=20):
     
     try:
         with db.get_connection() as conn:
-            cursor = conn.cursor()
+            # Unbuffered cursor: rows are printed as they arrive from the server
+            cursor = conn.cursor(db_driver.cursors.SSDictCursor)
             cursor.execute('''
                 SELECT level, message, timestamp, source
                 FROM logs
@@ -184,9 +188,7 @@ def show_logs(level="INFO", limit=20):
                 LIMIT %s
             ''', (level, limit))
             
-            logs = cursor.fetchall()
-            
-            for log in logs:
+            for log in cursor:
                 print(f"[{log['timestamp']}] {log['level']} ({log['source']})")
                 print(f"  {log['message']}")
                 print()
@@ -199,22 +201,29 @@ def export_data(format="json"):
     print(f"📤 Exporting location data to {format.upper()}...")
     
     try:
-        locations = db.get_locations(limit=10000)  # Export last 10k records
+        # Rows are streamed from the server and written one at a time
+        locations = db.iter_locations(limit=10000)  # Export last 10k records
         
         if format.lower() == "json":
-            import json
             filename = f"export_locations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w') as f:
-                json.dump(locations, f, indent=2)
+            with open(filename, 'wb') as f:
+                f.write(b'[')
+                for i, location in enumerate(locations):
+                    if i:
+                        f.write(b',\n')
+                    f.write(_dumps_row(location))
+                f.write(b']\n')
             print(f"✅ Data exported to {filename}")
             
         elif format.lower() == "csv":
             import csv
             filename = f"export_locations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             with open(filename, 'w', newline='') as f:
-                if locations:
-                    writer = csv.DictWriter(f, fieldnames=locations[0].keys())
+                first = next(locations, None)
+                if first:
+                    writer = csv.DictWriter(f, fieldnames=first.keys())
                     writer.writeheader()
+                    writer.writerow(first)
                     writer.writerows(locations)
             print(f"✅ Data exported to {filename}")
             
@@ -232,17 +241,24 @@ def optimize_database():
         with db.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Analyze tables for better query planning
-            cursor.execute("ANALYZE")
+            cursor.execute("""
+                SELECT TABLE_NAME AS name FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND ENGINE = 'InnoDB'
+                ORDER BY TABLE_NAME
+            """)
+            tables = [row['name'] for row in cursor.fetchall()]
             
-            # Vacuum to reclaim space
-            cursor.execute("VACUUM")
-            
-            # Rebuild indexes
-            cursor.execute("REINDEX")
+            for table in tables:
+                # Refresh index statistics for better query planning
+                cursor.execute(f"ANALYZE TABLE `{table}`")
+                cursor.fetchall()
+                
+                # Rebuild the table and its indexes to reclaim space
+                cursor.execute(f"OPTIMIZE TABLE `{table}`")
+                status = cursor.fetchall()[-1]
+                print(f"   {table}: {status['Msg_text']}")
             
-            conn.commit()
-            print("✅ Database optimized successfully")
+            print(f"✅ Database optimized successfully ({len(tables)} tables)")
             
     except Exception as e:
         print(f"❌ Error optimizing database: {e}")
@@ -260,14 +276,6 @@ def create_user(username=None, password=None, interactive=True):
         if not username:
             print("❌ Username is required")
             return False
-            
-        # Check if user already exists
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
-                print(f"❌ User '{username}' already exists")
-                return False
         
         # Get password
         if not password and interactive:
@@ -288,7 +296,7 @@ def create_user(username=None, password=None, interactive=True):
             admin_choice = input("Make this user an admin? (y/N): ").lower()
             is_admin = admin_choice == 'y'
         
-        # Create user using database function
+        # Create user using database function; the unique username key rejects duplicates
         if db.create_user(username, password, is_admin):
             admin_text = " as admin" if is_admin else ""
             print(f"✅ User '{username}' created successfully{admin_text}")
@@ -301,38 +309,6 @@ def create_user(username=None, password=None, interactive=True):
         print(f"❌ Error creating user: {e}")
         return False
 
-def list_users():
-    """List all users in the database"""
-    print("👥 User Accounts")
-    print("=" * 40)
-    
-    try:
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT username, created_at, last_login
-                FROM users
-                ORDER BY created_at DESC
-            ''')
-            
-            users = cursor.fetchall()
-            
-            if not users:
-                print("No users found in database")
-                return
-                
-            for user in users:
-                print(f"👤 {user['username']}")
-                print(f"   📅 Created: {user['created_at']}")
-                if user['last_login']:
-                    print(f"   🔑 Last Login: {user['last_login']}")
-                else:
-                    print(f"   🔑 Last Login: Never")
-                print()
-                
-    except Exception as e:
-        print(f"❌ Error listing users: {e}")
-
 def delete_user(username=None, interactive=True):
     """Delete a user account"""
     print("🗑️  Delete User Account")
@@ -346,14 +322,6 @@ def delete_user(username=None, interactive=True):
         if not username:
             print("❌ Username is required")
             return False
-            
-        # Check if user exists
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if not cursor.fetchone():
-                print(f"❌ User '{username}' not found")
-                return False
         
         # Confirm deletion
         if interactive:
@@ -362,11 +330,12 @@ def delete_user(username=None, interactive=True):
                 print("❌ Deletion cancelled")
                 return False
         
-        # Delete user using database function
+        # Delete user using database function; no rows affected means no such user
         if db.delete_user(username):
             print(f"✅ User '{username}' deleted successfully")
         else:
-            print(f"❌ Failed to delete user '{username}'")
+            print(f"❌ User '{username}' not found")
+            return False
         return True
         
     except Exception as e:
@@ -386,14 +355,6 @@ def change_password(username=None, interactive=True):
         if not username:
             print("❌ Username is required")
             return False
-            
-        # Check if user exists
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if not cursor.fetchone():
-                print(f"❌ User '{username}' not found")
-                return False
         
         # Get new password
         if interactive:
@@ -410,27 +371,25 @@ def change_password(username=None, interactive=True):
             print("❌ Password is required")
             return False
             
-        # Hash password
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
-        # Update password using database function
+        # Update password using database function; no rows affected means no such user
         if db.change_user_password(username, password):
             print(f"✅ Password updated for user '{username}'")
         else:
-            print(f"❌ Failed to update password for user '{username}'")
+            print(f"❌ User '{username}' not found")
+            return False
         return True
         
     except Exception as e:
         print(f"❌ Error changing password: {e}")
         return False
 
-def list_users():
+def list_users(limit=None, offset=0):
     """List all users in the database"""
     print("👥 User List")
     print("=" * 60)
     
     try:
-        users = db.get_all_users()
+        users = db.get_all_users(limit=limit, offset=offset)
         
         if not users:
             print("No users found in the database.")
@@ -466,16 +425,6 @@ def promote_admin(username=None, interactive=True):
             print("❌ Username is required")
             return False
         
-        # Check if user exists
-        user = db.get_user(username)
-        if not user:
-            print(f"❌ User '{username}' not found")
-            return False
-        
-        if user['is_admin']:
-            print(f"ℹ️  User '{username}' is already an admin")
-            return True
-        
         # Confirm promotion
         if interactive:
             confirm = input(f"Promote user '{username}' to admin? (y/N): ")
@@ -483,12 +432,12 @@ def promote_admin(username=None, interactive=True):
                 print("❌ Operation cancelled")
                 return False
         
-        # Promote user
+        # Promote user; no rows matched means no such user
         if db.update_user_admin_status(username, True):
             print(f"✅ User '{username}' promoted to admin")
             return True
         else:
-            print(f"❌ Failed to promote user '{username}'")
+            print(f"❌ User '{username}' not found")
             return False
             
     except Exception as e:
@@ -509,16 +458,6 @@ def revoke_admin(username=None, interactive=True):
             print("❌ Username is required")
             return False
         
-        # Check if user exists
-        user = db.get_user(username)
-        if not user:
-            print(f"❌ User '{username}' not found")
-            return False
-        
-        if not user['is_admin']:
-            print(f"ℹ️  User '{username}' is not an admin")
-            return True
-        
         # Confirm revocation
         if interactive:
             confirm = input(f"Revoke admin privileges from user '{username}'? (y/N): ")
@@ -526,12 +465,12 @@ def revoke_admin(username=None, interactive=True):
                 print("❌ Operation cancelled")
                 return False
         
-        # Revoke admin privileges
+        # Revoke admin privileges; no rows matched means no such user
         if db.update_user_admin_status(username, False):
             print(f"✅ Admin privileges revoked from user '{username}'")
             return True
         else:
-            print(f"❌ Failed to revoke admin privileges from user '{username}'")
+            print(f"❌ User '{username}' not found")
             return False
             
     except Exception as e:
@@ -545,7 +484,8 @@ def main():
         'create-user', 'list-users', 'delete-user', 'change-password', 'promote-admin', 'revoke-admin'
     ], help='Command to execute')
     
-    parser.add_argument('--limit', type=int, default=10, help='Limit for queries')
+    parser.add_argument('--limit', type=int, help='Limit for queries (default 10; all users for list-users)')
+    parser.add_argument('--offset', type=int, default=0, help='Offset for list-users paging')
     parser.add_argument('--days', type=int, default=30, help='Days for cleanup')
     parser.add_argument('--level', default='INFO', help='Log level')
     parser.add_argument('--format', default='json', help='Export format (json/csv)')
@@ -563,7 +503,7 @@ def main():
     elif args.command == 'devices':
         show_devices()
     elif args.command == 'locations':
-        show_recent_locations(args.limit)
+        show_recent_locations(args.limit or 10)
     elif args.command == 'cleanup':
         cleanup_old_data(args.days)
     elif args.command == 'backup':
@@ -571,7 +511,7 @@ def main():
     elif args.command == 'backup-info':
         backup_info()
     elif args.command == 'logs':
-        show_logs(args.level, args.limit)
+        show_logs(args.level, args.limit or 10)
     elif args.command == 'export':
         export_data(args.format)
     elif args.command == 'optimize':
@@ -579,7 +519,7 @@ def main():
     elif args.command == 'create-user':
         create_user(args.username, args.password, not args.username or not args.password)
     elif args.command == 'list-users':
-        list_users()
+        list_users(args.limit, args.offset)
     elif args.command == 'delete-user':
         delete_user(args.username, not args.username)
     elif args.command == 'change-password':
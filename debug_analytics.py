@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 """
 Debug script to test analytics functionality
+
+The device listing relies on the covering index that database.py creates on
+locations:
+
+    INDEX idx_device_time_desc (device_name, timestamp DESC)
 """
 
 import logging
@@ -31,10 +36,12 @@ def test_analytics():
     try:
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            # GROUP BY already yields one row per device; the covering index lets
+            # MariaDB count and take MAX(timestamp) without touching row data
             cursor.execute("""
-                SELECT DISTINCT device_name, COUNT(*) as count, 
+                SELECT device_name, COUNT(*) as count, 
                        MAX(timestamp) as last_seen 
-                FROM locations 
+                FROM locations USE INDEX (idx_device_time_desc)
                 GROUP BY device_name 
                 ORDER BY count DESC 
                 LIMIT 5
@@ -42,87 +49,78 @@ def test_analytics():
             devices = cursor.fetchall()
         
         if not devices:
-            print("❌ No devices found in database")
+            logger.info("❌ No devices found in database")
             return
         
-        print(f"📱 Found {len(devices)} devices:")
+        logger.info("📱 Found %d devices:", len(devices))
         for i, device in enumerate(devices, 1):
-            print(f"  {i}. {device['device_name']} ({device['count']} points, last: {device['last_seen']})")
+            logger.info("  %d. %s (%s points, last: %s)", i, device['device_name'], device['count'], device['last_seen'])
         
         # Test with first device
         test_device = devices[0]['device_name']
-        print(f"\n🧪 Testing analytics with device: {test_device}")
+        logger.info("🧪 Testing analytics with device: %s", test_device)
         
         # Test 1: Get device summary stats
         print("\n1️⃣ Testing get_device_summary_stats...")
         try:
             summary_stats = analytics.get_device_summary_stats(test_device, days=7)
-            print(f"✅ Summary stats retrieved")
-            print(f"   - Total points: {summary_stats.get('total_tracking_points', 0)}")
-            print(f"   - Daily analytics entries: {len(summary_stats.get('daily_analytics', []))}")
-            print(f"   - Weekly top locations: {len(summary_stats.get('weekly_top_locations', []))}")
-            print(f"   - Overall top locations: {len(summary_stats.get('overall_top_locations', []))}")
+            logger.info("✅ Summary stats retrieved")
+            logger.info("   - Total points: %s", summary_stats.get('total_tracking_points', 0))
+            logger.info("   - Daily analytics entries: %d", len(summary_stats.get('daily_analytics', [])))
+            logger.info("   - Weekly top locations: %d", len(summary_stats.get('weekly_top_locations', [])))
+            logger.info("   - Overall top locations: %d", len(summary_stats.get('overall_top_locations', [])))
             
             if summary_stats.get('weekly_top_locations'):
-                print("   📍 Weekly top locations:")
+                logger.info("   📍 Weekly top locations:")
                 for i, loc in enumerate(summary_stats['weekly_top_locations'][:3], 1):
-                    print(f"      {i}. {loc['address']} ({loc['visit_count']} visits, {loc['total_time_minutes']:.1f}m)")
+                    logger.info("      %d. %s (%s visits, %.1fm)", i, loc['address'], loc['visit_count'], loc['total_time_minutes'])
             else:
-                print("   ⚠️ No weekly top locations found")
+                logger.info("   ⚠️ No weekly top locations found")
                 
         except Exception as e:
-            print(f"❌ Error in get_device_summary_stats: {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("❌ Error in get_device_summary_stats: %s", e)
         
         # Test 2: Get top visited locations directly
         print("\n2️⃣ Testing get_top_visited_locations...")
         try:
             weekly_top = analytics.get_top_visited_locations(test_device, days=7, limit=5)
-            print(f"✅ Weekly top locations: {len(weekly_top)} found")
+            logger.info("✅ Weekly top locations: %d found", len(weekly_top))
             for i, loc in enumerate(weekly_top, 1):
-                print(f"   {i}. {loc['address']} - {loc['visit_count']} visits")
+                logger.info("   %d. %s - %s visits", i, loc['address'], loc['visit_count'])
             
             overall_top = analytics.get_top_visited_locations(test_device, days=None, limit=5)
-            print(f"✅ Overall top locations: {len(overall_top)} found")
+            logger.info("✅ Overall top locations: %d found", len(overall_top))
             for i, loc in enumerate(overall_top, 1):
-                print(f"   {i}. {loc['address']} - {loc['visit_count']} visits")
+                logger.info("   %d. %s - %s visits", i, loc['address'], loc['visit_count'])
                 
         except Exception as e:
-            print(f"❌ Error in get_top_visited_locations: {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("❌ Error in get_top_visited_locations: %s", e)
         
         # Test 3: Test address grouping
         print("\n3️⃣ Testing address grouping...")
         try:
-            # Get recent locations for the device
-            recent_locations = db.get_locations(
-                device_name=test_device,
-                limit=100
-            )
+            # Group the last week's locations in the database; only one row per group comes back
+            since = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+            location_groups = db.get_location_groups(test_device, since=since)
             
-            if recent_locations:
-                print(f"✅ Retrieved {len(recent_locations)} recent locations")
-                
-                # Test grouping
-                address_groups = analytics.group_locations_by_address(recent_locations)
-                print(f"✅ Grouped into {len(address_groups)} address groups")
+            if location_groups:
+                total_points = sum(group['point_count'] for group in location_groups)
+                logger.info("✅ Grouped %d recent locations into %d address groups", total_points, len(location_groups))
                 
-                for i, (address, locations) in enumerate(list(address_groups.items())[:5], 1):
-                    print(f"   {i}. {address} - {len(locations)} points")
+                # Geocode only the group centers that are printed
+                for i, group in enumerate(location_groups[:5], 1):
+                    address = analytics.get_address_from_coordinates(
+                        float(group['latitude']), float(group['longitude'])
+                    )
+                    logger.info("   %d. %s - %s points", i, address, group['point_count'])
             else:
-                print("❌ No recent locations found")
+                logger.info("❌ No recent locations found")
                 
         except Exception as e:
-            print(f"❌ Error in address grouping: {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("❌ Error in address grouping: %s", e)
         
     except Exception as e:
-        print(f"❌ Database error: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("❌ Database error: %s", e)
 
 def test_database_connection():
     """Test database connection"""
@@ -133,22 +131,19 @@ def test_database_connection():
         with db.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Test basic query
-            cursor.execute("SELECT COUNT(*) as total FROM locations")
-            result = cursor.fetchone()
-            print(f"✅ Database connected - Total locations: {result['total']}")
-            
-            # Test recent data
+            # Total and recent counts in one pass over the table
             cursor.execute("""
-                SELECT COUNT(*) as recent FROM locations 
-                WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+                SELECT COUNT(*) as total,
+                       COALESCE(SUM(timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)), 0) as recent
+                FROM locations
             """)
             result = cursor.fetchone()
-            print(f"✅ Recent data (7 days): {result['recent']} locations")
+            logger.info("✅ Database connected - Total locations: %s", result['total'])
+            logger.info("✅ Recent data (7 days): %d locations", result['recent'])
             
             return True
     except Exception as e:
-        print(f"❌ Database connection failed: {e}")
+        logger.error("❌ Database connection failed: %s", e)
         return False
 
 def main():
@@ -16,20 +16,45 @@ Features:
 - Provider health monitoring
 - Caching to reduce API calls
 - Configurable retry strategies
+
+Nominatim can point at a self-hosted instance (NOMINATIM_DOMAIN), which lifts the
+public 1 req/sec politeness limit. A minimal docker-compose service:
+
+    nominatim:
+      image: mediagis/nominatim:4.4
+      ports:
+        - "8080:8080"
+      environment:
+        PBF_URL: https://download.geofabrik.de/north-america/us-latest.osm.pbf
+      volumes:
+        - nominatim-data:/var/lib/postgresql/14/main
+      shm_size: 1gb
+
+then set NOMINATIM_DOMAIN=localhost:8080 and NOMINATIM_SCHEME=http.
 """
 
+import bisect
+import heapq
 import logging
+import threading
 import time
-import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import Any, List, Dict, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 import requests
 
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
 # GeoPy imports
 from geopy.geocoders import Nominatim, GoogleV3, MapBox, HereV7, ArcGIS, Photon
+from geopy.adapters import RequestsAdapter
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderRateLimited, GeocoderUnavailable
 
 # Configuration import
@@ -42,9 +67,26 @@ except ImportError:
         MAPBOX_API_KEY = ""
         HERE_API_KEY = ""
         GEOCODING_CACHE_SIZE = 1000
+        GEOCODING_DISK_CACHE_DIR = ""
+        GEOCODING_DISK_CACHE_DAYS = 30
+        NOMINATIM_DOMAIN = "nominatim.openstreetmap.org"
+        NOMINATIM_SCHEME = "https"
 
 logger = logging.getLogger(__name__)
 
+PUBLIC_NOMINATIM_DOMAIN = "nominatim.openstreetmap.org"
+
+# Columns of the per-provider usage counters
+USAGE_REQUESTS, USAGE_SUCCESSES, USAGE_FAILURES = 0, 1, 2
+
+# Returned by _get_from_cache when nothing is cached; a cached None means "known to fail"
+_CACHE_MISS = object()
+
+# Cache lifetimes in seconds; failed lookups are remembered briefly so repeated
+# misses skip the provider chain
+CACHE_TTL = 24 * 3600
+NEGATIVE_CACHE_TTL = 3600
+
 class ProviderStatus(Enum):
     HEALTHY = "healthy"
     RATE_LIMITED = "rate_limited" 
@@ -62,43 +104,87 @@ class ProviderConfig:
     retry_after: int = 300  # seconds to wait after rate limit
     max_retries: int = 3
     priority: int = 1  # lower = higher priority
+    geocoder: Any = None  # shared instance, reuses its HTTP session across requests
+    idx: int = 0  # position in GeocodingManager.providers, assigned at startup
+    domain: Optional[str] = None  # custom service host, e.g. a self-hosted Nominatim
+    scheme: Optional[str] = None
+    min_interval: float = field(init=False)  # seconds per request at rate_limit
+    
+    def __post_init__(self):
+        self.min_interval = 1.0 / self.rate_limit
 
 class GeocodingManager:
     """Multi-provider geocoding manager with automatic failover"""
     
-    def __init__(self, user_agent: str = "iTrax-LocationTracker", cache_size: int = None):
+    def __init__(self, user_agent: str = "iTrax-LocationTracker", cache_size: int = None,
+                 cache_precision: int = 3):
         self.user_agent = user_agent
-        self.cache = {}  # Simple in-memory cache
+        # In-memory LRU cache, least recently used first
+        # Values are (address, expiry epoch seconds) tuples
+        self.cache: 'OrderedDict[Tuple[int, int], Tuple[Optional[str], float]]' = OrderedDict()
+        # Decimal places kept in cache keys; 3 is ~110m, coarser than typical GPS jitter
+        self.cache_scale = 10 ** cache_precision
         self.cache_max_size = cache_size or getattr(Config, 'GEOCODING_CACHE_SIZE', 1000)
         
+        # Persistent tier behind the in-memory cache so resolved coordinates survive restarts
+        self.disk_cache = None
+        self.disk_cache_ttl = getattr(Config, 'GEOCODING_DISK_CACHE_DAYS', 30) * 86400
+        disk_cache_dir = getattr(Config, 'GEOCODING_DISK_CACHE_DIR', '')
+        if DISKCACHE_AVAILABLE and disk_cache_dir:
+            try:
+                self.disk_cache = diskcache.Cache(disk_cache_dir, size_limit=int(2e9))
+            except Exception as e:
+                logger.warning(f"Persistent geocoding cache unavailable: {e}")
+        
         # Provider status tracking
         self.provider_status = {}
         self.provider_last_attempt = {}
         self.provider_consecutive_failures = {}
+        # Per-provider token buckets: bursts up to rate_limit, refilled at rate_limit/s
+        self._buckets = {}
+        
+        # Lookups currently hitting providers, so concurrent callers for the same key share one
+        self._inflight: Dict[Tuple[int, int], Future] = {}
+        self._inflight_lock = threading.Lock()
         
         # Statistics
         self.stats = {
             'requests': 0,
             'cache_hits': 0,
             'successful_geocodes': 0,
-            'failed_geocodes': 0,
-            'provider_usage': {}
+            'failed_geocodes': 0
         }
+        # Per-provider [requests, successes, failures], indexed by provider.idx
+        self._usage: List[List[int]] = []
         
         # Initialize providers
         self.providers = self._initialize_providers()
         
+        # Indexes of healthy providers in priority order, plus a (ready_at, index) heap of
+        # degraded ones, so selection never walks providers that are still cooling down
+        self._provider_index = {p.name: i for i, p in enumerate(self.providers)}
+        self._healthy: List[int] = list(range(len(self.providers)))
+        self._cooldown: List[Tuple[float, int]] = []
+        self._unavailable_until: Dict[str, float] = {}
+        self._provider_lock = threading.Lock()
+        
     def _initialize_providers(self) -> List[ProviderConfig]:
         """Initialize all available geocoding providers"""
+        nominatim_domain = getattr(Config, 'NOMINATIM_DOMAIN', '') or PUBLIC_NOMINATIM_DOMAIN
+        # The public server allows 1 request per second; a self-hosted one has no such limit
+        nominatim_public = nominatim_domain == PUBLIC_NOMINATIM_DOMAIN
+        
         providers = [
             # Free providers (higher priority)
             ProviderConfig(
                 name="Nominatim",
                 geocoder_class=Nominatim,
-                rate_limit=1.0,  # 1 request per second
+                rate_limit=1.0 if nominatim_public else 1000.0,
                 user_agent=self.user_agent,
                 timeout=10,
-                priority=1
+                priority=1,
+                domain=nominatim_domain,
+                scheme=getattr(Config, 'NOMINATIM_SCHEME', 'https')
             ),
             ProviderConfig(
                 name="Photon", 
@@ -154,77 +240,126 @@ class GeocodingManager:
         providers.sort(key=lambda p: p.priority)
         
         # Initialize status tracking
-        for provider in providers:
+        self._usage = [[0, 0, 0] for _ in providers]
+        for i, provider in enumerate(providers):
+            provider.idx = i
+            provider.geocoder = self._create_geocoder(provider)
+            self._buckets[provider.name] = {'tokens': provider.rate_limit, 'last': time.monotonic()}
             self.provider_status[provider.name] = ProviderStatus.HEALTHY
             self.provider_last_attempt[provider.name] = 0
             self.provider_consecutive_failures[provider.name] = 0
-            self.stats['provider_usage'][provider.name] = {'requests': 0, 'successes': 0, 'failures': 0}
         
         logger.info(f"Initialized {len(providers)} geocoding providers: {[p.name for p in providers]}")
         return providers
     
-    def _generate_cache_key(self, lat: float, lng: float) -> str:
-        """Generate cache key for coordinates"""
-        # Round to 4 decimal places for cache efficiency (~11m precision)
-        coord_str = f"{lat:.4f},{lng:.4f}"
-        return hashlib.md5(coord_str.encode()).hexdigest()
+    def _generate_cache_key(self, lat: float, lng: float) -> Tuple[int, int]:
+        """Generate cache key for coordinates quantized to cache_precision decimals"""
+        return (int(round(lat * self.cache_scale)), int(round(lng * self.cache_scale)))
     
-    def _get_from_cache(self, cache_key: str) -> Optional[str]:
-        """Get address from cache if available and not expired"""
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            # Check if cache entry is less than 24 hours old
-            if datetime.now() - cached_data['timestamp'] < timedelta(hours=24):
+    def _get_from_cache(self, cache_key: Tuple[int, int]):
+        """Get address from cache if available and not expired
+        
+        Returns _CACHE_MISS when nothing usable is cached, otherwise the cached
+        address (None for a recent failed lookup).
+        """
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self.cache.move_to_end(cache_key)
                 self.stats['cache_hits'] += 1
-                return cached_data['address']
-            else:
-                # Remove expired entry
-                del self.cache[cache_key]
-        return None
+                return entry[0]
+            # Remove expired entry
+            del self.cache[cache_key]
+        
+        if self.disk_cache is not None:
+            try:
+                address = self.disk_cache.get(self._disk_key(cache_key))
+            except Exception as e:
+                logger.debug(f"Persistent geocoding cache read failed: {e}")
+                address = None
+            if address:
+                self._remember(cache_key, address)
+                self.stats['cache_hits'] += 1
+                return address
+        return _CACHE_MISS
     
-    def _add_to_cache(self, cache_key: str, address: str):
-        """Add address to cache"""
-        # Implement simple LRU by removing oldest entries when cache is full
-        if len(self.cache) >= self.cache_max_size:
-            # Remove oldest entry
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k]['timestamp'])
-            del self.cache[oldest_key]
+    def _add_to_cache(self, cache_key: Tuple[int, int], address: Optional[str]):
+        """Add address to cache (None records a failed lookup)"""
+        self._remember(cache_key, address)
         
-        self.cache[cache_key] = {
-            'address': address,
-            'timestamp': datetime.now()
-        }
+        # Only real addresses are worth persisting across restarts
+        if address is not None and self.disk_cache is not None:
+            try:
+                self.disk_cache.set(self._disk_key(cache_key), address, expire=self.disk_cache_ttl)
+            except Exception as e:
+                logger.debug(f"Persistent geocoding cache write failed: {e}")
     
-    def _is_provider_available(self, provider: ProviderConfig) -> bool:
-        """Check if provider is available for use"""
-        status = self.provider_status[provider.name]
+    @staticmethod
+    def _disk_key(cache_key: Tuple[int, int]) -> str:
+        """Flatten a cache key for the persistent tier
         
-        if status == ProviderStatus.HEALTHY:
-            return True
+        diskcache stores str keys and values natively but pickles tuples, so a
+        string key keeps every read and write free of serialization.
+        """
+        return f"{cache_key[0]},{cache_key[1]}"
+    
+    def _remember(self, cache_key: Tuple[int, int], address: Optional[str]):
+        """Store address in the in-memory LRU"""
+        # Evict the least recently used entry when cache is full
+        if cache_key not in self.cache and len(self.cache) >= self.cache_max_size:
+            self.cache.popitem(last=False)
         
-        # Check if enough time has passed since last failure
-        if status in [ProviderStatus.RATE_LIMITED, ProviderStatus.ERROR]:
-            time_since_last = time.time() - self.provider_last_attempt[provider.name]
-            if time_since_last > provider.retry_after:
-                # Reset status to healthy for retry
+        # Expiry is fixed at insert time so lookups only compare two floats
+        ttl = NEGATIVE_CACHE_TTL if address is None else CACHE_TTL
+        self.cache[cache_key] = (address, time.time() + ttl)
+        self.cache.move_to_end(cache_key)
+    
+    def _mark_unavailable(self, provider: ProviderConfig, status: ProviderStatus):
+        """Take provider out of rotation until its retry_after has elapsed"""
+        self.provider_status[provider.name] = status
+        idx = provider.idx
+        with self._provider_lock:
+            if idx in self._healthy:
+                self._healthy.remove(idx)
+                ready_at = time.time() + provider.retry_after
+                self._unavailable_until[provider.name] = ready_at
+                heapq.heappush(self._cooldown, (ready_at, idx))
+    
+    def _requeue_recovered_providers(self):
+        """Return providers whose cool-down has elapsed to the healthy list"""
+        now = time.time()
+        if not self._cooldown or self._cooldown[0][0] > now:
+            return
+        with self._provider_lock:
+            while self._cooldown and self._cooldown[0][0] <= now:
+                ready_at, idx = heapq.heappop(self._cooldown)
+                provider = self.providers[idx]
+                if idx in self._healthy or ready_at != self._unavailable_until.get(provider.name):
+                    # Stale entry left behind by reset_provider
+                    continue
                 self.provider_status[provider.name] = ProviderStatus.HEALTHY
                 self.provider_consecutive_failures[provider.name] = 0
+                bisect.insort(self._healthy, idx)
                 logger.info(f"Provider {provider.name} is available for retry")
-                return True
-        
-        return False
     
     def _create_geocoder(self, provider: ProviderConfig):
         """Create geocoder instance for provider"""
         try:
             kwargs = {
                 'user_agent': provider.user_agent or self.user_agent,
-                'timeout': provider.timeout
+                'timeout': provider.timeout,
+                # Keeps a requests.Session per geocoder so connections are kept alive
+                'adapter_factory': RequestsAdapter
             }
             
             if provider.api_key and provider.geocoder_class in [GoogleV3, MapBox, HereV7]:
                 kwargs['api_key'] = provider.api_key
             
+            if provider.domain:
+                kwargs['domain'] = provider.domain
+            if provider.scheme:
+                kwargs['scheme'] = provider.scheme
+            
             return provider.geocoder_class(**kwargs)
             
         except Exception as e:
@@ -233,18 +368,28 @@ class GeocodingManager:
     
     def _geocode_with_provider(self, provider: ProviderConfig, lat: float, lng: float) -> Optional[str]:
         """Attempt geocoding with specific provider"""
-        geocoder = self._create_geocoder(provider)
+        if provider.geocoder is None:
+            # Construction failed at startup; try again before giving up on this provider
+            provider.geocoder = self._create_geocoder(provider)
+        geocoder = provider.geocoder
         if not geocoder:
             return None
         
         try:
-            # Rate limiting
-            time_since_last = time.time() - self.provider_last_attempt[provider.name]
-            min_interval = 1.0 / provider.rate_limit
-            if time_since_last < min_interval:
-                sleep_time = min_interval - time_since_last
+            # Rate limiting (monotonic clock, unaffected by wall-clock adjustments)
+            bucket = self._buckets[provider.name]
+            now = time.monotonic()
+            bucket['tokens'] = min(provider.rate_limit,
+                                   bucket['tokens'] + (now - bucket['last']) * provider.rate_limit)
+            bucket['last'] = now
+            if bucket['tokens'] < 1:
+                sleep_time = (1 - bucket['tokens']) * provider.min_interval
                 logger.debug(f"Rate limiting: sleeping {sleep_time:.2f}s for {provider.name}")
                 time.sleep(sleep_time)
+                bucket['tokens'] = 0
+                bucket['last'] = time.monotonic()
+            else:
+                bucket['tokens'] -= 1
             
             self.provider_last_attempt[provider.name] = time.time()
             
@@ -256,7 +401,7 @@ class GeocodingManager:
                 # Success
                 self.provider_status[provider.name] = ProviderStatus.HEALTHY
                 self.provider_consecutive_failures[provider.name] = 0
-                self.stats['provider_usage'][provider.name]['successes'] += 1
+                self._usage[provider.idx][USAGE_SUCCESSES] += 1
                 self.stats['successful_geocodes'] += 1
                 
                 logger.debug(f"Successfully geocoded with {provider.name}: {location.address}")
@@ -267,9 +412,9 @@ class GeocodingManager:
                 
         except GeocoderRateLimited as e:
             logger.warning(f"Rate limited by {provider.name}: {e}")
-            self.provider_status[provider.name] = ProviderStatus.RATE_LIMITED
             self.provider_consecutive_failures[provider.name] += 1
-            self.stats['provider_usage'][provider.name]['failures'] += 1
+            self._mark_unavailable(provider, ProviderStatus.RATE_LIMITED)
+            self._usage[provider.idx][USAGE_FAILURES] += 1
             return None
             
         except (GeocoderTimedOut, GeocoderServiceError, GeocoderUnavailable) as e:
@@ -278,21 +423,21 @@ class GeocodingManager:
             
             # Mark as unavailable if too many consecutive failures
             if self.provider_consecutive_failures[provider.name] >= provider.max_retries:
-                self.provider_status[provider.name] = ProviderStatus.ERROR
+                self._mark_unavailable(provider, ProviderStatus.ERROR)
                 logger.error(f"Provider {provider.name} marked as unavailable after {provider.max_retries} failures")
             
-            self.stats['provider_usage'][provider.name]['failures'] += 1
+            self._usage[provider.idx][USAGE_FAILURES] += 1
             return None
             
         except Exception as e:
             logger.error(f"Unexpected error with {provider.name}: {e}")
             self.provider_consecutive_failures[provider.name] += 1
-            self.provider_status[provider.name] = ProviderStatus.ERROR
-            self.stats['provider_usage'][provider.name]['failures'] += 1
+            self._mark_unavailable(provider, ProviderStatus.ERROR)
+            self._usage[provider.idx][USAGE_FAILURES] += 1
             return None
         
         finally:
-            self.stats['provider_usage'][provider.name]['requests'] += 1
+            self._usage[provider.idx][USAGE_REQUESTS] += 1
     
     def get_address_from_coordinates(self, lat: float, lng: float, max_providers: int = None) -> Optional[str]:
         """
@@ -311,22 +456,50 @@ class GeocodingManager:
         # Check cache first
         cache_key = self._generate_cache_key(lat, lng)
         cached_address = self._get_from_cache(cache_key)
-        if cached_address:
+        if cached_address is not _CACHE_MISS:
             logger.debug(f"Cache hit for ({lat:.4f}, {lng:.4f}): {cached_address}")
             return cached_address
         
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[cache_key] = future
+        
+        if not is_leader:
+            # Another thread is already geocoding this key; wait for its answer
+            timeout = sum(p.timeout for p in self.providers) or None
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.warning(f"Timed out waiting for in-flight geocode of ({lat:.4f}, {lng:.4f})")
+                return None
+        
+        address = None
+        try:
+            address = self._geocode_uncached(cache_key, lat, lng, max_providers)
+        finally:
+            future.set_result(address)
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+        return address
+    
+    def _geocode_uncached(self, cache_key: Tuple[int, int], lat: float, lng: float,
+                          max_providers: int = None) -> Optional[str]:
+        """Run the provider failover chain for a cache miss and cache the outcome"""
         # Try providers in priority order
         providers_tried = 0
         max_to_try = max_providers or len(self.providers)
         
-        for provider in self.providers:
+        self._requeue_recovered_providers()
+        
+        # Copy, since failures below take providers out of the healthy list
+        for idx in list(self._healthy):
             if providers_tried >= max_to_try:
                 break
-                
-            if not self._is_provider_available(provider):
-                logger.debug(f"Skipping unavailable provider: {provider.name}")
-                continue
             
+            provider = self.providers[idx]
             providers_tried += 1
             logger.debug(f"Trying provider {provider.name} ({providers_tried}/{max_to_try})")
             
@@ -340,8 +513,34 @@ class GeocodingManager:
         # All providers failed
         logger.warning(f"All available providers failed for coordinates ({lat:.4f}, {lng:.4f})")
         self.stats['failed_geocodes'] += 1
+        self._add_to_cache(cache_key, None)
         return None
     
+    def get_addresses_from_coordinates(self, coords: List[Tuple[float, float]],
+                                       max_providers: int = None) -> List[Optional[str]]:
+        """
+        Reverse geocode many coordinates, resolving each distinct cache key only once
+        
+        Args:
+            coords: (latitude, longitude) pairs
+            max_providers: Maximum number of providers to try per coordinate
+            
+        Returns:
+            Addresses (or None) in the same order as coords
+        """
+        keys = [self._generate_cache_key(lat, lng) for lat, lng in coords]
+        
+        # Nearby points share a key, so only one of them reaches the providers
+        unique = {}
+        for key, coord in zip(keys, coords):
+            unique.setdefault(key, coord)
+        
+        resolved = {
+            key: self.get_address_from_coordinates(lat, lng, max_providers)
+            for key, (lat, lng) in unique.items()
+        }
+        return [resolved[key] for key in keys]
+    
     def get_provider_status(self) -> Dict:
         """Get status of all providers"""
         status = {}
@@ -350,14 +549,24 @@ class GeocodingManager:
                 'status': self.provider_status[provider.name].value,
                 'consecutive_failures': self.provider_consecutive_failures[provider.name],
                 'last_attempt': self.provider_last_attempt[provider.name],
-                'usage_stats': self.stats['provider_usage'][provider.name]
+                'usage_stats': self._usage_dict(provider)
             }
         return status
     
+    def _usage_dict(self, provider: ProviderConfig) -> Dict:
+        """Build the reporting view of a provider's usage counters"""
+        usage = self._usage[provider.idx]
+        return {
+            'requests': usage[USAGE_REQUESTS],
+            'successes': usage[USAGE_SUCCESSES],
+            'failures': usage[USAGE_FAILURES]
+        }
+    
     def get_stats(self) -> Dict:
         """Get geocoding statistics"""
         return {
             **self.stats,
+            'provider_usage': {p.name: self._usage_dict(p) for p in self.providers},
             'cache_size': len(self.cache),
             'provider_status': self.get_provider_status()
         }
@@ -367,6 +576,11 @@ class GeocodingManager:
         if provider_name in self.provider_status:
             self.provider_status[provider_name] = ProviderStatus.HEALTHY
             self.provider_consecutive_failures[provider_name] = 0
+            idx = self._provider_index[provider_name]
+            with self._provider_lock:
+                if idx not in self._healthy:
+                    # Its cool-down heap entry is skipped when it comes due
+                    bisect.insort(self._healthy, idx)
             logger.info(f"Reset provider {provider_name} to healthy status")
     
     def clear_cache(self):
@@ -387,4 +601,8 @@ def get_geocoding_manager() -> GeocodingManager:
 
 def get_address_from_coordinates(lat: float, lng: float) -> Optional[str]:
     """Convenience function for geocoding"""
-    return get_geocoding_manager().get_address_from_coordinates(lat, lng)
\ No newline at end of file
+    return get_geocoding_manager().get_address_from_coordinates(lat, lng)
+
+def get_addresses_from_coordinates(coords: List[Tuple[float, float]]) -> List[Optional[str]]:
+    """Convenience function for batch geocoding"""
+    return get_geocoding_manager().get_addresses_from_coordinates(coords)
\ No newline at end of file
@@ -4,11 +4,13 @@ GPS Performance Maintenance Script
 Cleans up address cache and optimizes database for better GPS log performance
 """
 
+import json
 import logging
 import sys
 import os
+import time
 from datetime import datetime, timedelta
-from database import Database
+from database import Database, db_driver
 
 # Configure logging
 logging.basicConfig(
@@ -17,13 +19,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# OPTIMIZE TABLE only pays off once this share of a table's data pages is free space
+REBUILD_FREE_RATIO = 0.2
+
+# Purge batches are resized to keep each DELETE near this many seconds
+PURGE_TARGET_SECONDS = 0.2
+PURGE_MIN_BATCH = 500
+PURGE_MAX_BATCH = 50000
+
+# The offline detector's per-device window query, checked against the planner
+WINDOW_QUERY = """
+    SELECT latitude, longitude, timestamp, accuracy
+    FROM locations
+    WHERE device_name = %s AND timestamp >= %s AND timestamp <= %s
+    ORDER BY timestamp ASC
+"""
+# Row estimate above which the window query is reported as not using a good index
+WINDOW_QUERY_ROWS_WARNING = 10000
+
+REPORT_FILE = 'gps_performance_report.json'
+# A saved report younger than this stands in for the initial report of a run
+REPORT_SNAPSHOT_MAX_AGE = 300
+
 class GPSMaintenance:
     def __init__(self):
         self.db = Database()
+        # SHOW TABLE STATUS / SHOW INDEX results, dropped whenever a task changes the tables
+        self._table_status_cache = None
     
     def cleanup_address_cache(self, keep_count: int = 10000):
         """Clean up old address cache entries"""
         logger.info("Starting address cache cleanup...")
+        self._table_status_cache = None
         
         try:
             success = self.db.cleanup_address_cache(keep_count)
@@ -36,21 +63,43 @@ class GPSMaintenance:
             logger.error(f"❌ Error during address cache cleanup: {e}")
             return False
     
-    def optimize_database_indexes(self):
-        """Optimize database indexes for GPS performance"""
+    def optimize_database_indexes(self, rebuild: bool = False, create_index: bool = False):
+        """Refresh planner statistics; rebuild fragmented tables only when asked"""
         logger.info("Optimizing database indexes...")
+        self._table_status_cache = None
         
         try:
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Analyze tables to update statistics
-                cursor.execute("ANALYZE TABLE locations")
-                cursor.execute("ANALYZE TABLE address_cache")
+                if create_index:
+                    # Covers the window query, so it becomes an index-only range scan
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_dev_ts
+                        ON locations (device_name, timestamp, latitude, longitude, accuracy)
+                    """)
+                    logger.info("Ensured covering index idx_dev_ts on locations")
+                
+                # Analyze tables to update statistics (InnoDB persists them across restarts)
+                cursor.execute("ANALYZE TABLE locations, address_cache")
+                cursor.fetchall()
+                
+                if rebuild:
+                    # OPTIMIZE rewrites the whole table and its indexes, so skip tables
+                    # that are not fragmented enough to gain from it
+                    for table in ('locations', 'address_cache'):
+                        cursor.execute("SHOW TABLE STATUS LIKE %s", (table,))
+                        info = cursor.fetchone()
+                        data_length = (info['Data_length'] or 0) if info else 0
+                        data_free = (info['Data_free'] or 0) if info else 0
+                        if data_length and data_free / data_length > REBUILD_FREE_RATIO:
+                            logger.info(f"Rebuilding {table} ({data_free / data_length:.0%} free space)")
+                            cursor.execute(f"OPTIMIZE TABLE {table}")
+                            cursor.fetchall()
+                        else:
+                            logger.info(f"Skipping rebuild of {table}; fragmentation is low")
                 
-                # Optimize tables
-                cursor.execute("OPTIMIZE TABLE locations")
-                cursor.execute("OPTIMIZE TABLE address_cache")
+                self._check_window_query_plan(cursor)
                 
                 logger.info("✅ Database optimization completed")
                 return True
@@ -59,9 +108,35 @@ class GPSMaintenance:
             logger.error(f"❌ Database optimization failed: {e}")
             return False
     
+    def _check_window_query_plan(self, cursor):
+        """Warn when the planner would not serve the window query from an index"""
+        cursor.execute("SELECT device_name FROM locations ORDER BY id DESC LIMIT 1")
+        latest = cursor.fetchone()
+        if not latest:
+            return
+        
+        end_time = datetime.now()
+        cursor.execute(f"EXPLAIN {WINDOW_QUERY}",
+                       (latest['device_name'], end_time - timedelta(hours=2), end_time))
+        for step in cursor.fetchall():
+            extra = step.get('Extra') or ''
+            rows = step.get('rows') or 0
+            if 'Using filesort' in extra or rows > WINDOW_QUERY_ROWS_WARNING:
+                logger.warning(f"⚠️  Window query plan uses key {step.get('key')} "
+                               f"(~{rows:,} rows, {extra or 'no extra'}); "
+                               f"consider --create-index")
+            else:
+                logger.info(f"Window query uses index {step.get('key')} (~{rows:,} rows)")
+    
     def vacuum_logs_table(self, days_to_keep: int = 365):
-        """Remove old location records to keep database size manageable"""
+        """Remove old location records to keep database size manageable
+        
+        Rows are deleted rather than dropped by partition: locations has a foreign key
+        to devices (InnoDB cannot partition tables with foreign keys), and dropping a
+        partition would bypass the delete trigger that keeps device_stats in step.
+        """
         logger.info(f"Cleaning old location records (keeping last {days_to_keep} days)...")
+        self._table_status_cache = None
         
         try:
             cutoff_date = datetime.now() - timedelta(days=days_to_keep)
@@ -69,39 +144,74 @@ class GPSMaintenance:
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Count records to be deleted
+                # Highest id that can still be old, so batches never walk past it;
+                # NULL means there is nothing to delete
                 cursor.execute("""
-                    SELECT COUNT(*) as old_count FROM locations 
+                    SELECT MAX(id) as max_id FROM locations 
                     WHERE timestamp < %s
                 """, (cutoff_date,))
-                
                 result = cursor.fetchone()
-                old_count = result['old_count'] if result else 0
+                max_id = result['max_id'] if result else None
                 
-                if old_count > 0:
-                    logger.info(f"Found {old_count:,} old records to clean up")
+                if max_id is not None:
+                    # Planner estimate for progress output; an exact COUNT(*) would scan
+                    # the whole range a second time
+                    cursor.execute("EXPLAIN SELECT 1 FROM locations WHERE timestamp < %s", (cutoff_date,))
+                    plan = cursor.fetchone()
+                    old_count = int(plan['rows'] or 0) if plan else 0
+                    logger.info(f"Found about {old_count:,} old records to clean up")
                     
-                    # Delete old records in batches to avoid locking
-                    batch_size = 10000
-                    deleted_total = 0
+                    # Fail fast on lock waits so a stuck batch is retried smaller instead
+                    # of blocking the tracker's inserts
+                    cursor.execute("SET SESSION innodb_lock_wait_timeout = 5")
                     
-                    while True:
-                        cursor.execute("""
-                            DELETE FROM locations 
-                            WHERE timestamp < %s 
-                            LIMIT %s
-                        """, (cutoff_date, batch_size))
+                    try:
+                        # Delete old records in batches to avoid locking, paging by primary key
+                        # so each batch starts where the last one ended
+                        batch_size = 10000
+                        deleted_total = 0
+                        last_id = 0
+                        retries = 0
+                        
+                        while True:
+                            cursor.execute("""
+                                SELECT id FROM locations 
+                                WHERE id > %s AND id <= %s AND timestamp < %s 
+                                ORDER BY id 
+                                LIMIT %s
+                            """, (last_id, max_id, cutoff_date, batch_size))
+                            ids = [row['id'] for row in cursor.fetchall()]
+                            if not ids:
+                                break
                         
-                        deleted = cursor.rowcount
-                        if deleted == 0:
-                            break
-                            
-                        deleted_total += deleted
-                        logger.info(f"Deleted {deleted_total:,} / {old_count:,} old records")
+                            placeholders = ', '.join(['%s'] * len(ids))
+                            started = time.monotonic()
+                            try:
+                                cursor.execute(f"DELETE FROM locations WHERE id IN ({placeholders})", ids)
+                            except db_driver.OperationalError as e:
+                                # 1205 = lock wait timeout exceeded; back off and retry a smaller batch
+                                if e.args and e.args[0] == 1205 and retries < 5:
+                                    retries += 1
+                                    batch_size = max(PURGE_MIN_BATCH, batch_size // 2)
+                                    logger.warning(f"Lock wait timeout, retrying with batch size {batch_size:,}")
+                                    time.sleep(0.5 * 2 ** retries)
+                                    continue
+                                raise
+                            elapsed = time.monotonic() - started
                         
-                        # Small delay between batches
-                        import time
-                        time.sleep(0.1)
+                            retries = 0
+                            last_id = ids[-1]
+                            deleted_total += cursor.rowcount
+                            logger.info(f"Deleted {deleted_total:,} / ~{old_count:,} old records")
+                        
+                            # Grow batches while the server keeps up, shrink them when it is busy
+                            if elapsed < PURGE_TARGET_SECONDS / 2:
+                                batch_size = min(PURGE_MAX_BATCH, batch_size * 2)
+                            elif elapsed > PURGE_TARGET_SECONDS * 2:
+                                batch_size = max(PURGE_MIN_BATCH, batch_size // 2)
+                    finally:
+                        # The connection goes back to the pool, so don't leak the short timeout
+                        cursor.execute("SET SESSION innodb_lock_wait_timeout = DEFAULT")
                     
                     logger.info(f"✅ Cleaned up {deleted_total:,} old location records")
                 else:
@@ -113,76 +223,111 @@ class GPSMaintenance:
             logger.error(f"❌ Error during logs cleanup: {e}")
             return False
     
-    def generate_performance_report(self):
-        """Generate a performance report"""
-        logger.info("Generating performance report...")
-        
-        try:
-            stats = self.db.get_statistics()
-            
+    def _table_status(self) -> dict:
+        """Size and index details for the report, fetched once until a task invalidates them"""
+        if self._table_status_cache is None:
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Get table sizes
-                cursor.execute("SHOW TABLE STATUS LIKE 'locations'")
-                locations_info = cursor.fetchone()
-                
-                cursor.execute("SHOW TABLE STATUS LIKE 'address_cache'")
-                cache_info = cursor.fetchone()
+                cursor.execute("SHOW TABLE STATUS WHERE Name IN ('locations', 'address_cache')")
+                status = {row['Name']: row for row in cursor.fetchall()}
                 
                 # Get index information
                 cursor.execute("SHOW INDEX FROM locations")
                 indexes = cursor.fetchall()
-                
-                report = {
-                    'timestamp': datetime.now().isoformat(),
-                    'database_stats': stats,
-                    'table_sizes': {
-                        'locations': {
-                            'rows': locations_info['Rows'] if locations_info else 0,
-                            'data_size_mb': round((locations_info['Data_length'] or 0) / 1024 / 1024, 2) if locations_info else 0,
-                            'index_size_mb': round((locations_info['Index_length'] or 0) / 1024 / 1024, 2) if locations_info else 0
-                        },
-                        'address_cache': {
-                            'rows': cache_info['Rows'] if cache_info else 0,
-                            'data_size_mb': round((cache_info['Data_length'] or 0) / 1024 / 1024, 2) if cache_info else 0
-                        }
-                    },
-                    'indexes_count': len(indexes) if indexes else 0
-                }
-                
-                # Print report
-                print("\n📊 GPS PERFORMANCE REPORT")
-                print("=" * 40)
-                print(f"Generated: {report['timestamp']}")
-                print("\n📈 Database Statistics:")
-                print(f"   Total locations: {stats.get('total_locations', 0):,}")
-                print(f"   Unique devices: {stats.get('unique_devices', 0)}")
-                print(f"   Today's records: {stats.get('today_count', 0):,}")
-                print(f"   Address cache size: {stats.get('address_cache_size', 0):,}")
-                
-                print("\n💾 Table Sizes:")
-                locations_size = report['table_sizes']['locations']
-                print(f"   Locations: {locations_size['rows']:,} rows, {locations_size['data_size_mb']} MB data, {locations_size['index_size_mb']} MB indexes")
-                
-                cache_size = report['table_sizes']['address_cache']
-                print(f"   Address cache: {cache_size['rows']:,} rows, {cache_size['data_size_mb']} MB data")
-                
-                print(f"\n🔍 Indexes: {report['indexes_count']} total indexes")
-                
-                # Save report
-                import json
-                with open('gps_performance_report.json', 'w') as f:
-                    json.dump(report, f, indent=2)
-                
-                logger.info("✅ Performance report generated and saved to gps_performance_report.json")
+            
+            self._table_status_cache = {
+                'locations': status.get('locations'),
+                'address_cache': status.get('address_cache'),
+                'indexes_count': len(indexes) if indexes else 0
+            }
+        return self._table_status_cache
+    
+    def _load_report_snapshot(self, max_age: int):
+        """Return the saved report if it is younger than max_age seconds"""
+        try:
+            if time.time() - os.path.getmtime(REPORT_FILE) > max_age:
+                return None
+            with open(REPORT_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _print_report(self, report: dict):
+        """Print a performance report"""
+        stats = report['database_stats']
+        print("\n📊 GPS PERFORMANCE REPORT")
+        print("=" * 40)
+        print(f"Generated: {report['timestamp']}")
+        print("\n📈 Database Statistics:")
+        print(f"   Total locations: {stats.get('total_locations', 0):,}")
+        print(f"   Unique devices: {stats.get('unique_devices', 0)}")
+        print(f"   Today's records: {stats.get('today_count', 0):,}")
+        print(f"   Address cache size: {stats.get('address_cache_size', 0):,}")
+        
+        print("\n💾 Table Sizes:")
+        locations_size = report['table_sizes']['locations']
+        print(f"   Locations: {locations_size['rows']:,} rows, {locations_size['data_size_mb']} MB data, {locations_size['index_size_mb']} MB indexes")
+        
+        cache_size = report['table_sizes']['address_cache']
+        print(f"   Address cache: {cache_size['rows']:,} rows, {cache_size['data_size_mb']} MB data")
+        
+        print(f"\n🔍 Indexes: {report['indexes_count']} total indexes")
+    
+    def generate_performance_report(self, max_age: int = None):
+        """Generate a performance report
+        
+        Args:
+            max_age: Reuse the saved report instead if it is at most this many seconds old
+        """
+        logger.info("Generating performance report...")
+        
+        if max_age:
+            report = self._load_report_snapshot(max_age)
+            if report:
+                self._print_report(report)
+                logger.info(f"✅ Reused performance report from {report['timestamp']}")
                 return report
+        
+        try:
+            stats = self.db.get_statistics()
+            table_status = self._table_status()
+            locations_info = table_status['locations']
+            cache_info = table_status['address_cache']
+            
+            report = {
+                'timestamp': datetime.now().isoformat(),
+                'database_stats': stats,
+                'table_sizes': {
+                    'locations': {
+                        'rows': locations_info['Rows'] if locations_info else 0,
+                        'data_size_mb': round((locations_info['Data_length'] or 0) / 1024 / 1024, 2) if locations_info else 0,
+                        'index_size_mb': round((locations_info['Index_length'] or 0) / 1024 / 1024, 2) if locations_info else 0
+                    },
+                    'address_cache': {
+                        'rows': cache_info['Rows'] if cache_info else 0,
+                        'data_size_mb': round((cache_info['Data_length'] or 0) / 1024 / 1024, 2) if cache_info else 0
+                    }
+                },
+                'indexes_count': table_status['indexes_count']
+            }
+            
+            self._print_report(report)
+            
+            # Save report
+            with open(REPORT_FILE, 'w') as f:
+                json.dump(report, f, indent=2)
+            
+            logger.info(f"✅ Performance report generated and saved to {REPORT_FILE}")
+            return report
                 
         except Exception as e:
             logger.error(f"❌ Error generating performance report: {e}")
             return None
     
-    def run_maintenance(self, cleanup_cache=True, optimize_db=True, cleanup_old_data=False, days_to_keep=365):
+    def run_maintenance(self, cleanup_cache=True, optimize_db=True, cleanup_old_data=False, days_to_keep=365,
+                        rebuild=False, create_index=False):
         """Run full maintenance routine"""
         logger.info("🔧 Starting GPS performance maintenance")
         logger.info("=" * 50)
@@ -192,7 +337,7 @@ class GPSMaintenance:
         
         # Generate initial report
         logger.info("\n📊 Initial performance report:")
-        self.generate_performance_report()
+        self.generate_performance_report(max_age=REPORT_SNAPSHOT_MAX_AGE)
         
         # Address cache cleanup
         if cleanup_cache:
@@ -203,7 +348,7 @@ class GPSMaintenance:
         # Database optimization
         if optimize_db:
             total_tasks += 1
-            if self.optimize_database_indexes():
+            if self.optimize_database_indexes(rebuild, create_index):
                 success_count += 1
         
         # Old data cleanup (optional)
@@ -236,6 +381,10 @@ def main():
     parser.add_argument('--skip-optimize', action='store_true', help='Skip database optimization')
     parser.add_argument('--cleanup-old-data', action='store_true', help='Enable old data cleanup')
     parser.add_argument('--days-to-keep', type=int, default=365, help='Days of data to keep (default: 365)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Also OPTIMIZE (rebuild) tables with over 20%% free space')
+    parser.add_argument('--create-index', action='store_true',
+                        help='Create the covering idx_dev_ts index on locations if missing')
     parser.add_argument('--report-only', action='store_true', help='Only generate performance report')
     
     args = parser.parse_args()
@@ -250,7 +399,9 @@ def main():
             cleanup_cache=not args.skip_cache_cleanup,
             optimize_db=not args.skip_optimize,
             cleanup_old_data=args.cleanup_old_data,
-            days_to_keep=args.days_to_keep
+            days_to_keep=args.days_to_keep,
+            rebuild=args.rebuild,
+            create_index=args.create_index
         )
         
         sys.exit(0 if success else 1)
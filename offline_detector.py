@@ -8,11 +8,44 @@ across multiple location updates, which is very unlikely in normal usage.
 
 import logging
 import math
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
 from typing import List, Dict, Optional, Tuple
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Mean radius of the earth in meters
+EARTH_RADIUS_M = 6371000
+
+# Fewest samples analyze_location_pattern will judge a device on
+DEFAULT_MIN_SAMPLES = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(ts) -> Optional[float]:
+    """Seconds since the epoch for a datetime or ISO string, None if unparseable
+    
+    Naive datetimes are counted as wall-clock time, like subtracting them directly,
+    so a DST change between samples doesn't add or remove an hour.
+    """
+    if not isinstance(ts, datetime):
+        try:
+            ts = datetime.fromisoformat(str(ts).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if ts.tzinfo is None:
+        return (ts - _EPOCH).total_seconds()
+    return ts.timestamp()
+
 class OfflineDetector:
     def __init__(self, db=None):
         """Initialize the offline detector with database connection"""
@@ -36,17 +69,63 @@ class OfflineDetector:
         a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
         c = 2 * math.asin(math.sqrt(a))
         
-        # Radius of earth in meters
-        r = 6371000
-        return c * r
+        return c * EARTH_RADIUS_M
+    
+    def _rows_to_soa(self, locations: List[Dict]):
+        """
+        Split row dicts into contiguous float64 columns in a single pass
+        
+        Returns (latitude, longitude, accuracy) arrays; missing accuracy is NaN.
+        """
+        columns = np.array(
+            [(loc['latitude'], loc['longitude'], loc.get('accuracy')) for loc in locations],
+            dtype=np.float64
+        ).T.copy()
+        return columns[0], columns[1], columns[2]
     
-    def analyze_location_pattern(self, locations: List[Dict], min_samples: int = 5) -> Dict:
+    def _movement_stats(self, locations: List[Dict], coords=None) -> Tuple[float, float]:
+        """Total and largest distance in meters between consecutive locations
+        
+        coords, when given, are the latitude and longitude arrays from _rows_to_soa.
+        """
+        n = len(locations)
+        if n < 2:
+            return 0.0, 0.0
+        
+        if coords is not None:
+            # Haversine over all consecutive pairs at once
+            lat = np.radians(coords[0])
+            lon = np.radians(coords[1])
+            dlat = np.diff(lat)
+            dlon = np.diff(lon)
+            a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+            distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+            return float(distances.sum()), float(distances.max())
+        
+        total_distance = 0
+        max_distance = 0
+        for i in range(1, n):
+            prev_loc = locations[i-1]
+            curr_loc = locations[i]
+            
+            distance = self.calculate_distance(
+                prev_loc['latitude'], prev_loc['longitude'],
+                curr_loc['latitude'], curr_loc['longitude']
+            )
+            total_distance += distance
+            max_distance = max(max_distance, distance)
+        return total_distance, max_distance
+    
+    def analyze_location_pattern(self, locations: List[Dict], min_samples: int = DEFAULT_MIN_SAMPLES,
+                                 fast_mode: bool = False) -> Dict:
         """
         Analyze location pattern to detect offline behavior
         
         Args:
             locations: List of location records sorted by timestamp
             min_samples: Minimum number of samples needed for analysis
+            fast_mode: Stop once the accuracy indicators alone prove the device is
+                       offline; the result then only carries the accuracy metrics
             
         Returns:
             Dictionary with analysis results
@@ -60,46 +139,39 @@ class OfflineDetector:
             }
         
         # Check for identical accuracy values (main offline indicator)
-        accuracy_values = []
-        identical_accuracy_count = 0
-        
-        for loc in locations:
-            accuracy = loc.get('accuracy')
-            if accuracy is not None:
-                accuracy_values.append(accuracy)
-                
-                # Check if this accuracy matches previous ones exactly
-                if len(accuracy_values) > 1 and accuracy == accuracy_values[-2]:
-                    identical_accuracy_count += 1
-        
-        # Calculate metrics
-        total_accuracy_samples = len(accuracy_values)
         accuracy_variance = 0
         
-        if total_accuracy_samples > 1:
-            avg_accuracy = sum(accuracy_values) / total_accuracy_samples
-            accuracy_variance = sum((x - avg_accuracy) ** 2 for x in accuracy_values) / total_accuracy_samples
-        
-        # Check for identical coordinates (secondary indicator)
-        coordinate_pairs = [(loc['latitude'], loc['longitude']) for loc in locations]
-        identical_coordinates = len(set(coordinate_pairs)) == 1
-        
-        # Check movement pattern
-        total_distance = 0
-        max_distance = 0
-        
-        for i in range(1, len(locations)):
-            prev_loc = locations[i-1]
-            curr_loc = locations[i]
+        if NUMPY_AVAILABLE:
+            lat, lon, acc = self._rows_to_soa(locations)
+            acc = acc[~np.isnan(acc)]
+            total_accuracy_samples = len(acc)
+            # Consecutive samples whose accuracy matches the previous one exactly
+            identical_accuracy_count = int(np.count_nonzero(acc[1:] == acc[:-1]))
+            if total_accuracy_samples > 1:
+                accuracy_variance = float(acc.var())
+        else:
+            identical_accuracy_count = 0
+            total_accuracy_samples = 0
+            previous = None
+            # Welford's running mean and sum of squared deviations: one pass, no value list
+            mean = 0.0
+            squares = 0.0
             
-            distance = self.calculate_distance(
-                prev_loc['latitude'], prev_loc['longitude'],
-                curr_loc['latitude'], curr_loc['longitude']
-            )
-            total_distance += distance
-            max_distance = max(max_distance, distance)
-        
-        avg_distance = total_distance / max(1, len(locations) - 1)
+            for loc in locations:
+                accuracy = loc.get('accuracy')
+                if accuracy is not None:
+                    total_accuracy_samples += 1
+                    delta = accuracy - mean
+                    mean += delta / total_accuracy_samples
+                    squares += delta * (accuracy - mean)
+                    
+                    # Check if this accuracy matches the previous one exactly
+                    if accuracy == previous:
+                        identical_accuracy_count += 1
+                    previous = accuracy
+            
+            if total_accuracy_samples > 1:
+                accuracy_variance = squares / total_accuracy_samples
         
         # Determine if phone is likely offline based on multiple factors
         offline_indicators = []
@@ -120,6 +192,37 @@ class OfflineDetector:
             offline_indicators.append(f'Very low accuracy variance: {accuracy_variance:.2f}')
             confidence += 20
         
+        if fast_mode and confidence >= 50:
+            # Already over the offline threshold; skip the coordinate and time passes
+            return {
+                'is_offline': True,
+                'confidence': min(confidence, 100),
+                'reason': '; '.join(offline_indicators),
+                'sample_count': len(locations),
+                'metrics': {
+                    'identical_accuracy_count': identical_accuracy_count,
+                    'total_accuracy_samples': total_accuracy_samples,
+                    'accuracy_variance': accuracy_variance
+                }
+            }
+        
+        # Check for identical coordinates (secondary indicator)
+        coords = None
+        if NUMPY_AVAILABLE:
+            coords = (lat, lon)
+            identical_coordinates = bool((lat == lat[0]).all() and (lon == lon[0]).all())
+        else:
+            # Stops at the first move
+            first_lat = locations[0]['latitude']
+            first_lon = locations[0]['longitude']
+            identical_coordinates = all(
+                loc['latitude'] == first_lat and loc['longitude'] == first_lon for loc in locations
+            )
+        
+        # Check movement pattern
+        total_distance, max_distance = self._movement_stats(locations, coords)
+        avg_distance = total_distance / max(1, len(locations) - 1)
+        
         # Tertiary indicator: Identical coordinates
         if identical_coordinates:
             offline_indicators.append('All coordinates identical')
@@ -131,22 +234,25 @@ class OfflineDetector:
             confidence += 10
         
         # Time pattern indicator: Regular intervals (cached data)
-        timestamps = []
-        for loc in locations:
-            try:
-                ts = datetime.fromisoformat(str(loc['timestamp']).replace('Z', '+00:00'))
-                timestamps.append(ts)
-            except:
-                pass
+        seconds = [t for t in (_epoch_seconds(loc['timestamp']) for loc in locations) if t is not None]
         
-        if len(timestamps) >= min_samples:
-            intervals = []
-            for i in range(1, len(timestamps)):
-                interval = (timestamps[i] - timestamps[i-1]).total_seconds()
-                intervals.append(interval)
+        if len(seconds) >= min_samples and len(seconds) > 1:
+            # Spread between the shortest and longest gap
+            if NUMPY_AVAILABLE:
+                interval_spread = float(np.ptp(np.diff(np.array(seconds, dtype=np.float64))))
+            else:
+                # Tracked in a single pass
+                shortest = longest = seconds[1] - seconds[0]
+                for i in range(2, len(seconds)):
+                    interval = seconds[i] - seconds[i-1]
+                    if interval < shortest:
+                        shortest = interval
+                    elif interval > longest:
+                        longest = interval
+                interval_spread = longest - shortest
             
             # Check if intervals are suspiciously regular
-            if intervals and max(intervals) - min(intervals) < 60:  # Within 1 minute variation
+            if interval_spread < 60:  # Within 1 minute variation
                 offline_indicators.append('Suspiciously regular time intervals')
                 confidence += 15
         
@@ -194,11 +300,15 @@ class OfflineDetector:
             end_time = datetime.now()
             start_time = end_time - timedelta(hours=hours_back)
             
+            from database import db_driver
+            
             with self.db.get_connection() as conn:
-                cursor = conn.cursor()
+                # Unbuffered cursor: rows are read in chunks instead of the driver
+                # buffering the whole window before handing it over
+                cursor = conn.cursor(db_driver.cursors.SSDictCursor)
                 
                 query = """
-                    SELECT latitude, longitude, timestamp, accuracy, battery_level, is_charging
+                    SELECT latitude, longitude, timestamp, accuracy
                     FROM locations
                     WHERE device_name = %s 
                     AND timestamp >= %s 
@@ -206,8 +316,16 @@ class OfflineDetector:
                     ORDER BY timestamp ASC
                 """
                 
-                cursor.execute(query, (device_name, start_time, end_time))
-                locations = list(cursor.fetchall())
+                try:
+                    cursor.execute(query, (device_name, start_time, end_time))
+                    locations = []
+                    while True:
+                        chunk = cursor.fetchmany(4096)
+                        if not chunk:
+                            break
+                        locations.extend(chunk)
+                finally:
+                    cursor.close()
             
             if not locations:
                 return {
@@ -237,12 +355,37 @@ class OfflineDetector:
                 'time_range': f'{hours_back} hours'
             }
     
-    def check_all_devices_offline_status(self, hours_back: int = 2) -> List[Dict]:
+    def _ruled_out_by_aggregates(self, stats: Dict, min_samples: int = DEFAULT_MIN_SAMPLES) -> bool:
+        """
+        Whether per-device SQL aggregates already prove the device is online
+        
+        Without the identical-accuracy (>= 60%) and low-variance indicators, the
+        remaining indicators add up to at most 40, below the offline threshold of 50.
+        Consecutive identical accuracies can never exceed samples - distinct values,
+        so that bound is enough to rule out the ratio indicator.
+        """
+        if stats['n'] < min_samples:
+            # analyze_location_pattern reports these as insufficient data
+            return False
+        
+        acc_n = stats['acc_n']
+        if acc_n < max(min_samples, 2):
+            # Neither accuracy indicator applies
+            return True
+        
+        max_identical_ratio = (acc_n - stats['distinct_acc']) / (acc_n - 1)
+        return max_identical_ratio < 0.6 and stats['acc_var'] is not None and stats['acc_var'] >= 1.0
+    
+    def check_all_devices_offline_status(self, hours_back: int = 2, workers: int = None,
+                                         fast_mode: bool = False) -> List[Dict]:
         """
         Check offline status for all devices with recent activity
         
         Args:
             hours_back: Number of hours back to analyze
+            workers: Analyze devices in this many processes (None = in this process);
+                     only worth it for long windows with many devices
+            fast_mode: Passed to analyze_location_pattern
             
         Returns:
             List of analysis results for each device
@@ -251,45 +394,110 @@ class OfflineDetector:
             if not self.db:
                 return []
                 
-            # Get list of devices with recent activity
+            # Get devices with recent activity along with their accuracy aggregates
             end_time = datetime.now()
             start_time = end_time - timedelta(hours=hours_back)
             
+            from database import db_driver
+            
+            results = {}
+            # One connection serves both the aggregate query and the raw-row stream
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
-                    SELECT DISTINCT device_name 
+                    SELECT device_name,
+                           COUNT(*) AS n,
+                           COUNT(accuracy) AS acc_n,
+                           COUNT(DISTINCT accuracy) AS distinct_acc,
+                           VAR_POP(accuracy) AS acc_var
                     FROM locations 
                     WHERE timestamp >= %s 
+                    AND timestamp <= %s
+                    GROUP BY device_name
                     ORDER BY device_name
-                """, (start_time,))
+                """, (start_time, end_time))
                 
-                devices = [row['device_name'] for row in cursor.fetchall()]
-            
-            results = []
-            for device_name in devices:
-                analysis = self.check_device_offline_status(device_name, hours_back)
-                results.append(analysis)
+                device_stats = cursor.fetchall()
+                
+                candidates = []
+                for stats in device_stats:
+                    device_name = stats['device_name']
+                    if self._ruled_out_by_aggregates(stats):
+                        # Accuracy varies normally; no need to pull the raw rows
+                        results[device_name] = {
+                            'device_name': device_name,
+                            'is_offline': False,
+                            'confidence': 0,
+                            'reason': 'Accuracy radius varies normally',
+                            'sample_count': stats['n'],
+                            'time_range': f'{hours_back} hours',
+                            'metrics': {
+                                'distinct_accuracy_count': stats['distinct_acc'],
+                                'total_accuracy_samples': stats['acc_n'],
+                                'accuracy_variance': float(stats['acc_var']) if stats['acc_var'] is not None else 0
+                            }
+                        }
+                    else:
+                        candidates.append(device_name)
+                
+                if candidates:
+                    # Raw rows for every remaining device in one round trip, streamed and
+                    # split per device as they arrive
+                    placeholders = ', '.join(['%s'] * len(candidates))
+                    cursor = conn.cursor(db_driver.cursors.SSDictCursor)
+                    try:
+                        cursor.execute(f"""
+                            SELECT device_name, latitude, longitude, timestamp, accuracy
+                            FROM locations
+                            WHERE device_name IN ({placeholders})
+                            AND timestamp >= %s 
+                            AND timestamp <= %s
+                            ORDER BY device_name, timestamp ASC
+                        """, (*candidates, start_time, end_time))
+                        
+                        if workers and workers > 1:
+                            # Devices are independent, so spread the analysis over processes
+                            with ProcessPoolExecutor(max_workers=workers) as executor:
+                                futures = {
+                                    device_name: executor.submit(_analyze_rows, list(rows), fast_mode)
+                                    for device_name, rows in groupby(cursor, key=itemgetter('device_name'))
+                                }
+                                analyses = {name: future.result() for name, future in futures.items()}
+                        else:
+                            analyses = {
+                                device_name: self.analyze_location_pattern(list(rows), fast_mode=fast_mode)
+                                for device_name, rows in groupby(cursor, key=itemgetter('device_name'))
+                            }
+                    finally:
+                        cursor.close()
+                    
+                    for device_name, analysis in analyses.items():
+                        analysis['device_name'] = device_name
+                        analysis['time_range'] = f'{hours_back} hours'
+                        results[device_name] = analysis
             
-            return results
+            return [results[stats['device_name']] for stats in device_stats
+                    if stats['device_name'] in results]
             
         except Exception as e:
             logger.error(f"Error checking offline status for all devices: {e}")
             return []
     
-    def get_offline_summary_report(self, hours_back: int = 2) -> Dict:
+    def get_offline_summary_report(self, hours_back: int = 2, workers: int = None) -> Dict:
         """
         Generate a summary report of offline devices
         
         Args:
             hours_back: Number of hours back to analyze
+            workers: Processes to analyze devices in (see check_all_devices_offline_status)
             
         Returns:
             Summary report dictionary
         """
         try:
-            all_results = self.check_all_devices_offline_status(hours_back)
+            # Only the verdicts are reported, so obvious offline devices can stop early
+            all_results = self.check_all_devices_offline_status(hours_back, workers, fast_mode=True)
             
             offline_devices = [r for r in all_results if r['is_offline']]
             online_devices = [r for r in all_results if not r['is_offline']]
@@ -321,6 +529,13 @@ class OfflineDetector:
             }
 
 
+def _analyze_rows(rows: List[Dict], fast_mode: bool = False) -> Dict:
+    """Process pool entry point; the analysis never touches the database"""
+    detector = OfflineDetector.__new__(OfflineDetector)
+    detector.db = None
+    return detector.analyze_location_pattern(rows, fast_mode=fast_mode)
+
+
 def main():
     """Command line interface for offline detection"""
     import argparse
@@ -332,6 +547,8 @@ def main():
     parser.add_argument('--all', action='store_true', help='Check all devices')
     parser.add_argument('--summary', action='store_true', help='Generate summary report')
     parser.add_argument('--json', action='store_true', help='Output as JSON')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Analyze devices in parallel processes (for long --hours windows)')
     
     args = parser.parse_args()
     
@@ -353,7 +570,7 @@ def main():
     
     elif args.all or args.summary:
         # Check all devices or generate summary
-        report = detector.get_offline_summary_report(args.hours)
+        report = detector.get_offline_summary_report(args.hours, args.workers)
         
         if args.json:
             print(json.dumps(report, indent=2))
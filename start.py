@@ -9,6 +9,7 @@ or run them separately based on command line arguments.
 import os
 import sys
 import time
+import selectors
 import subprocess
 import signal
 import argparse
@@ -43,9 +44,24 @@ def check_config():
     print("✅ Configuration looks good")
     return True
 
+def exec_script(script):
+    """Replace this process with `python script` so only one interpreter stays resident
+    
+    Only on POSIX; Windows' execv spawns a new process and exits this one, which
+    detaches it from the console, so there we return and the caller runs it as a
+    subprocess instead.
+    """
+    if os.name != 'posix':
+        return
+    # Buffered output would be lost with the old process image
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, [sys.executable, script])
+
 def start_tracker():
     """Start the location tracker"""
     print("🚀 Starting iCloud location tracker...")
+    exec_script("tracker.py")
     try:
         subprocess.run([sys.executable, "tracker.py"], check=True)
     except KeyboardInterrupt:
@@ -56,6 +72,7 @@ def start_tracker():
 def start_webapp():
     """Start the web application"""
     print("🌐 Starting web application...")
+    exec_script("app.py")
     try:
         subprocess.run([sys.executable, "app.py"], check=True)
     except KeyboardInterrupt:
@@ -63,6 +80,36 @@ def start_webapp():
     except subprocess.CalledProcessError as e:
         print(f"❌ Web app failed to start: {e}")
 
+def wait_for_first_exit(processes):
+    """Block until one of the child processes exits and return it
+    
+    On Linux each child gets a pidfd, which becomes readable when the child
+    exits, so we sleep in the kernel until there is something to do. We don't
+    reap with os.waitpid(-1) because the backup scheduler runs mysqldump as a
+    child of this process too. Elsewhere we fall back to polling.
+    """
+    if hasattr(os, 'pidfd_open'):
+        fds = []
+        try:
+            with selectors.DefaultSelector() as selector:
+                for process in processes:
+                    fd = os.pidfd_open(process.pid)
+                    fds.append(fd)
+                    selector.register(fd, selectors.EVENT_READ, process)
+                key, _ = selector.select()[0]
+                return key.data
+        except OSError:
+            pass  # Kernel older than 5.3; poll instead
+        finally:
+            for fd in fds:
+                os.close(fd)
+    
+    while True:
+        for process in processes:
+            if process.poll() is not None:
+                return process
+        time.sleep(1)
+
 def start_both():
     """Start both tracker and web app"""
     print("🚀 Starting iTrax (both tracker and web app)...")
@@ -92,16 +139,12 @@ def start_both():
         print("⏹️  Press Ctrl+C to stop both services")
         
         # Wait for either process to finish
-        while True:
-            if tracker_process.poll() is not None:
-                print("❌ Tracker stopped unexpectedly")
-                webapp_process.terminate()
-                break
-            if webapp_process.poll() is not None:
-                print("❌ Web app stopped unexpectedly")
-                tracker_process.terminate()
-                break
-            time.sleep(1)
+        if wait_for_first_exit([tracker_process, webapp_process]) is tracker_process:
+            print("❌ Tracker stopped unexpectedly")
+            webapp_process.terminate()
+        else:
+            print("❌ Web app stopped unexpectedly")
+            tracker_process.terminate()
             
     except KeyboardInterrupt:
         print("\n⏹️  Stopping services...")
@@ -3,13 +3,67 @@ Timezone utilities for iTrax
 Handles timezone conversion and formatting
 """
 
-import pytz
-from datetime import datetime
-from typing import Optional, Union
+import functools
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from datetime import datetime, timezone
+from typing import Iterable, List, Mapping, Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 
+# Optional C ISO-8601 parser; accepts 'Z' and caches fixed-offset tzinfos
+try:
+    import ciso8601
+    CISO8601_AVAILABLE = True
+except ImportError:
+    CISO8601_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+UTC = timezone.utc
+
+if CISO8601_AVAILABLE:
+    _parse_iso = ciso8601.parse_datetime
+else:
+    def _parse_iso(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+@functools.lru_cache(maxsize=512)
+def _get_tz(name: str) -> ZoneInfo:
+    """Return the ZoneInfo for name, keeping a strong reference to every zone used"""
+    return ZoneInfo(name)
+
+
+# Formatted strings keyed by (UTC epoch, timezone, format); list pages format
+# the same timestamps over and over
+FORMAT_CACHE_SIZE = 4096
+_format_cache: 'OrderedDict[tuple, str]' = OrderedDict()
+_format_cache_lock = threading.Lock()
+
+# Friendly names keyed by timezone string -> (name, UTC hour it was computed in).
+# Abbreviation and offset only change at DST transitions, which fall on the hour
+# for every zone we offer, so recomputing once per hour keeps them exact.
+_friendly_cache: dict = {}
+
+
+def _as_aware(value: Union[datetime, str]) -> datetime:
+    """Parse an ISO string if needed and return an aware datetime, treating naive values as UTC
+    
+    Aware values keep their offset: astimezone() to the user's zone works from any
+    offset, so normalising to UTC first would only convert twice.
+    """
+    # Exact-type check first: database rows are plain datetimes and skip the
+    # isinstance call; str subclasses such as Markup still get parsed
+    if type(value) is not datetime and isinstance(value, str):
+        value = _parse_iso(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
 def convert_utc_to_user_timezone(utc_datetime: Union[datetime, str], user_timezone: str = 'America/Chicago') -> datetime:
     """
     Convert UTC datetime to user's timezone
@@ -22,28 +76,26 @@ def convert_utc_to_user_timezone(utc_datetime: Union[datetime, str], user_timezo
         datetime object in user's timezone
     """
     try:
-        # Handle string input
-        if isinstance(utc_datetime, str):
-            if utc_datetime.endswith('Z'):
-                utc_datetime = utc_datetime[:-1] + '+00:00'
-            utc_datetime = datetime.fromisoformat(utc_datetime.replace('Z', '+00:00'))
+        # Fast path: aware datetimes (what format_datetime_for_user hands us) need
+        # no parsing and convert in a single astimezone call
+        if type(utc_datetime) is datetime and utc_datetime.tzinfo is not None:
+            return utc_datetime.astimezone(_get_tz(user_timezone))
         
-        # Ensure UTC timezone is set
-        if utc_datetime.tzinfo is None:
-            utc_datetime = pytz.UTC.localize(utc_datetime)
-        elif utc_datetime.tzinfo != pytz.UTC:
-            utc_datetime = utc_datetime.astimezone(pytz.UTC)
+        # Parse strings and mark naive values as UTC
+        utc_datetime = _as_aware(utc_datetime)
         
         # Convert to user timezone
-        user_tz = pytz.timezone(user_timezone)
+        user_tz = _get_tz(user_timezone)
         local_datetime = utc_datetime.astimezone(user_tz)
         
         return local_datetime
         
     except Exception as e:
         logger.error(f"Error converting timezone: {e}")
-        # Fallback to original datetime
-        return utc_datetime if isinstance(utc_datetime, datetime) else datetime.now()
+        # Fallback to original datetime, shown in UTC
+        if isinstance(utc_datetime, datetime):
+            return utc_datetime.astimezone(UTC) if utc_datetime.tzinfo is not None else utc_datetime
+        return datetime.now()
 
 def convert_local_to_utc(local_datetime: Union[datetime, str], user_timezone: str = 'America/Chicago') -> datetime:
     """
@@ -58,22 +110,21 @@ def convert_local_to_utc(local_datetime: Union[datetime, str], user_timezone: st
     """
     try:
         # Handle string input
-        if isinstance(local_datetime, str):
-            local_datetime = datetime.fromisoformat(local_datetime)
+        if type(local_datetime) is not datetime and isinstance(local_datetime, str):
+            local_datetime = _parse_iso(local_datetime)
         
         # Set timezone if not already set
         if local_datetime.tzinfo is None:
-            user_tz = pytz.timezone(user_timezone)
-            local_datetime = user_tz.localize(local_datetime)
+            local_datetime = local_datetime.replace(tzinfo=_get_tz(user_timezone))
         
         # Convert to UTC
-        utc_datetime = local_datetime.astimezone(pytz.UTC)
+        utc_datetime = local_datetime.astimezone(UTC)
         
         return utc_datetime
         
     except Exception as e:
         logger.error(f"Error converting to UTC: {e}")
-        return datetime.utcnow()
+        return datetime.now(UTC)
 
 def format_datetime_for_user(dt: Union[datetime, str], user_timezone: str = 'America/Chicago', 
                            date_format: str = '%Y-%m-%d %I:%M:%S %p') -> str:
@@ -89,16 +140,25 @@ def format_datetime_for_user(dt: Union[datetime, str], user_timezone: str = 'Ame
         Formatted datetime string
     """
     try:
+        utc_dt = _as_aware(dt)
+        key = (utc_dt.timestamp(), user_timezone, date_format)
+        with _format_cache_lock:
+            formatted = _format_cache.get(key)
+            if formatted is not None:
+                _format_cache.move_to_end(key)
+                return formatted
+        
         # Convert to user timezone
-        local_dt = convert_utc_to_user_timezone(dt, user_timezone)
+        local_dt = convert_utc_to_user_timezone(utc_dt, user_timezone)
         
-        # Format according to user preference
-        formatted = local_dt.strftime(date_format)
+        # Format according to user preference, with the timezone abbreviation
+        # appended in the same strftime call when there is one
+        formatted = local_dt.strftime(date_format + ' %Z' if local_dt.tzname() else date_format)
         
-        # Add timezone abbreviation
-        tz_abbrev = local_dt.strftime('%Z')
-        if tz_abbrev:
-            formatted += f" {tz_abbrev}"
+        with _format_cache_lock:
+            _format_cache[key] = formatted
+            if len(_format_cache) > FORMAT_CACHE_SIZE:
+                _format_cache.popitem(last=False)
         
         return formatted
         
@@ -109,6 +169,27 @@ def format_datetime_for_user(dt: Union[datetime, str], user_timezone: str = 'Ame
             return dt
         return dt.strftime('%Y-%m-%d %H:%M:%S UTC')
 
+def format_batch(utc_epochs: Iterable[float], user_timezone: str = 'America/Chicago',
+                 date_format: str = '%Y-%m-%d %I:%M:%S %p') -> List[str]:
+    """
+    Format many UTC epoch timestamps in one call
+    
+    The timezone is resolved once and each value goes straight through
+    datetime.fromtimestamp, skipping the per-row parsing, locking and
+    cache lookups of format_datetime_for_user.
+    
+    Args:
+        utc_epochs: UTC epoch seconds
+        user_timezone: User's timezone string
+        date_format: Strftime format string (no timezone abbreviation appended)
+    
+    Returns:
+        Formatted strings in input order
+    """
+    tz = _get_tz(user_timezone)
+    fromtimestamp = datetime.fromtimestamp
+    return [fromtimestamp(epoch, tz).strftime(date_format) for epoch in utc_epochs]
+
 def get_current_time_in_timezone(user_timezone: str = 'America/Chicago') -> datetime:
     """
     Get current time in user's timezone
@@ -120,11 +201,10 @@ def get_current_time_in_timezone(user_timezone: str = 'America/Chicago') -> date
         Current datetime in user's timezone
     """
     try:
-        utc_now = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        return convert_utc_to_user_timezone(utc_now, user_timezone)
+        return datetime.now(_get_tz(user_timezone))
     except Exception as e:
         logger.error(f"Error getting current time: {e}")
-        return datetime.now()
+        return datetime.now(UTC)
 
 def validate_timezone(timezone_str: str) -> bool:
     """
@@ -137,9 +217,9 @@ def validate_timezone(timezone_str: str) -> bool:
         True if valid, False otherwise
     """
     try:
-        pytz.timezone(timezone_str)
+        _get_tz(timezone_str)
         return True
-    except pytz.exceptions.UnknownTimeZoneError:
+    except (ZoneInfoNotFoundError, ValueError):
         return False
 
 def get_timezone_offset(timezone_str: str) -> str:
@@ -153,7 +233,7 @@ def get_timezone_offset(timezone_str: str) -> str:
         Offset string
     """
     try:
-        tz = pytz.timezone(timezone_str)
+        tz = _get_tz(timezone_str)
         now = datetime.now(tz)
         offset = now.strftime('%z')
         
@@ -176,20 +256,26 @@ def get_user_friendly_timezone_name(timezone_str: str) -> str:
     Returns:
         Friendly name (e.g., 'Central Standard Time')
     """
+    hour = int(time.time()) // 3600
+    cached = _friendly_cache.get(timezone_str)
+    if cached is not None and cached[1] == hour:
+        return cached[0]
+    
     try:
-        tz = pytz.timezone(timezone_str)
+        tz = _get_tz(timezone_str)
         now = datetime.now(tz)
         
         # Get long timezone name
         tzname = now.strftime('%Z %z')
+        _friendly_cache[timezone_str] = (tzname, hour)
         return tzname
         
     except Exception as e:
         logger.error(f"Error getting timezone name: {e}")
         return timezone_str
 
-# Common timezone mappings for quick access
-COMMON_TIMEZONES = {
+# Common timezone mappings for quick access (read-only, shared by all callers)
+COMMON_TIMEZONES = MappingProxyType({
     'America/New_York': 'Eastern Time (US/Canada)',
     'America/Chicago': 'Central Time (US/Canada)', 
     'America/Denver': 'Mountain Time (US/Canada)',
@@ -202,8 +288,13 @@ COMMON_TIMEZONES = {
     'Europe/Paris': 'Central European Time',
     'Asia/Tokyo': 'Japan Standard Time',
     'Australia/Sydney': 'Australian Eastern Time'
-}
+})
 
-def get_common_timezones() -> dict:
+def get_common_timezones() -> Mapping[str, str]:
     """Get dictionary of common timezones with friendly names"""
-    return COMMON_TIMEZONES
\ No newline at end of file
+    return COMMON_TIMEZONES
+
+# Warm the friendly-name cache for the common zones at import
+for _tz_name in COMMON_TIMEZONES:
+    get_user_friendly_timezone_name(_tz_name)
+del _tz_name
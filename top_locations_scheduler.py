@@ -7,21 +7,45 @@ Provides much faster loading for top 10 all-time locations by pre-computing resu
 """
 
 import logging
+import multiprocessing
 import time
 import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Iterable, List, Dict, Tuple
 
-from database import db
+from config import Config
+from database import db, db_driver
 from analytics import analytics
 
 logger = logging.getLogger(__name__)
 
+# Longest the scheduler sleeps between checks, so devices that have never been
+# cached are still picked up without waiting for the next expiry
+MAX_IDLE_SECONDS = 900
+
+# Shortest sleep between checks. A cache that stays expired (a refresh that found
+# nothing or failed to save) would otherwise be retried in a tight loop
+MIN_IDLE_SECONDS = 60
+
+# Caches refreshed side by side by the scheduler; each worker process holds its own
+# database connection
+INITIAL_UPDATE_WORKERS = min(4, max(1, Config.DATABASE_POOL_SIZE // 2))
+
+def _compute_top_locations(device_name: str, cache_type: str) -> List[Dict]:
+    """Run the top locations aggregation for one device (executed in the worker process)"""
+    days = 7 if cache_type == 'weekly' else None
+    return analytics.get_top_visited_locations(device_name=device_name, days=days, limit=10)
+
 class TopLocationsCacheScheduler:
     def __init__(self):
         self.running = False
         self.thread = None
         self.update_interval = 2.5 * 3600  # 2.5 hours in seconds
+        self._stop = threading.Event()
+        # The aggregation is pure Python, so it runs in a separate process where it
+        # can't hold the GIL against the web request threads
+        self._executor = None
         
     def start(self):
         """Start the background scheduler"""
@@ -30,6 +54,10 @@ class TopLocationsCacheScheduler:
             return
             
         self.running = True
+        self._stop.clear()
+        # spawn rather than fork: forking a threaded web process can copy held locks
+        self._executor = ProcessPoolExecutor(max_workers=INITIAL_UPDATE_WORKERS,
+                                             mp_context=multiprocessing.get_context('spawn'))
         self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.thread.start()
         logger.info("Top locations cache scheduler started")
@@ -37,8 +65,12 @@ class TopLocationsCacheScheduler:
     def stop(self):
         """Stop the background scheduler"""
         self.running = False
+        self._stop.set()
         if self.thread:
             self.thread.join(timeout=10)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         logger.info("Top locations cache scheduler stopped")
         
     def _run_scheduler(self):
@@ -50,10 +82,8 @@ class TopLocationsCacheScheduler:
         
         while self.running:
             try:
-                # Wait for next update interval
-                time.sleep(60)  # Check every minute for efficiency
-                
-                if not self.running:
+                # Sleep until the earliest cache expires; stop() wakes us early
+                if self._stop.wait(timeout=self._seconds_until_next_update()):
                     break
                     
                 # Check if any cache needs updating
@@ -61,24 +91,27 @@ class TopLocationsCacheScheduler:
                 
             except Exception as e:
                 logger.error(f"Error in cache scheduler: {e}")
-                time.sleep(300)  # Wait 5 minutes on error
+                if self._stop.wait(timeout=300):  # Wait 5 minutes on error
+                    break
                 
         logger.info("Cache scheduler thread stopped")
         
+    def _seconds_until_next_update(self) -> float:
+        """Seconds until the earliest cached entry expires, kept within MIN_IDLE_SECONDS..MAX_IDLE_SECONDS"""
+        next_update = db.get_earliest_next_cache_update()
+        if next_update is None:
+            return MAX_IDLE_SECONDS
+        remaining = (next_update - datetime.now()).total_seconds()
+        return min(max(remaining, MIN_IDLE_SECONDS), MAX_IDLE_SECONDS)
+        
     def _check_and_update_caches(self):
         """Check which devices need cache updates and update them"""
         try:
-            # Check for expired weekly caches
-            weekly_devices = db.get_devices_needing_cache_update('weekly')
-            for device in weekly_devices:
-                logger.info(f"Updating weekly cache for device: {device}")
-                self._update_device_cache(device, 'weekly')
-                
-            # Check for expired all-time caches
-            alltime_devices = db.get_devices_needing_cache_update('alltime')
-            for device in alltime_devices:
-                logger.info(f"Updating all-time cache for device: {device}")
-                self._update_device_cache(device, 'alltime')
+            # Expired or missing weekly and all-time caches, weekly first
+            expired = [(row['device_name'], row['cache_type']) for row in db.get_all_expired_caches()]
+            for device, cache_type in expired:
+                logger.info(f"Updating {cache_type} cache for device: {device}")
+            self._update_caches(expired)
                 
         except Exception as e:
             logger.error(f"Error checking cache updates: {e}")
@@ -87,79 +120,93 @@ class TopLocationsCacheScheduler:
         """Update caches for all devices (initial run)"""
         try:
             # Get all devices with location data
-            with db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT device_name FROM locations")
-                devices = [row['device_name'] for row in cursor.fetchall()]
+            devices = db.get_tracked_device_names()
                 
             logger.info(f"Performing initial cache update for {len(devices)} devices")
-            
-            for device in devices:
-                logger.info(f"Initial cache update for device: {device}")
-                self._update_device_cache(device, 'weekly')
-                self._update_device_cache(device, 'alltime')
+            self._update_caches((device_name, cache_type)
+                                for device_name in devices
+                                for cache_type in ('weekly', 'alltime'))
                 
         except Exception as e:
             logger.error(f"Error in initial cache update: {e}")
             
+    def _update_caches(self, caches: Iterable[Tuple[str, str]]):
+        """Recompute (device, cache type) pairs on the worker processes and save each as it finishes"""
+        executor = self._executor
+        if executor is None:
+            for device_name, cache_type in caches:
+                self._update_device_cache(device_name, cache_type)
+            return
+        
+        futures = {executor.submit(_compute_top_locations, device_name, cache_type): (device_name, cache_type, time.time())
+                   for device_name, cache_type in caches}
+        for future in as_completed(futures):
+            device_name, cache_type, start_time = futures[future]
+            try:
+                self._save_device_cache(device_name, cache_type, future.result(), start_time)
+            except CancelledError:
+                # stop() cancelled the remaining work
+                return
+            except Exception as e:
+                logger.error(f"Error updating {cache_type} cache for {device_name}: {e}")
+            
     def _update_device_cache(self, device_name: str, cache_type: str):
-        """Update cache for a specific device and type"""
+        """Update cache for a specific device and type in the calling thread"""
         try:
             start_time = time.time()
             
             # Get fresh top locations data
-            if cache_type == 'weekly':
-                locations = analytics.get_top_visited_locations(
-                    device_name=device_name, 
-                    days=7, 
-                    limit=10
-                )
-            else:  # alltime
-                locations = analytics.get_top_visited_locations(
-                    device_name=device_name, 
-                    days=None, 
-                    limit=10
-                )
-                
-            if locations:
-                # Save to cache
-                success = db.save_cached_top_locations(device_name, cache_type, locations)
-                
-                duration = time.time() - start_time
-                if success:
-                    logger.info(f"Updated {cache_type} cache for {device_name}: {len(locations)} locations in {duration:.2f}s")
-                else:
-                    logger.error(f"Failed to save {cache_type} cache for {device_name}")
-            else:
-                logger.warning(f"No locations found for {device_name} ({cache_type})")
+            locations = _compute_top_locations(device_name, cache_type)
+            self._save_device_cache(device_name, cache_type, locations, start_time)
                 
         except Exception as e:
             logger.error(f"Error updating {cache_type} cache for {device_name}: {e}")
             import traceback
             logger.error(f"Cache update traceback: {traceback.format_exc()}")
             
+    def _save_device_cache(self, device_name: str, cache_type: str, locations: List[Dict], start_time: float):
+        """Store freshly computed top locations for a device"""
+        if locations:
+            # Save to cache
+            success = db.save_cached_top_locations(device_name, cache_type, locations)
+            
+            duration = time.time() - start_time
+            if success:
+                logger.info(f"Updated {cache_type} cache for {device_name}: {len(locations)} locations in {duration:.2f}s")
+            else:
+                logger.error(f"Failed to save {cache_type} cache for {device_name}")
+        else:
+            logger.warning(f"No locations found for {device_name} ({cache_type})")
+            
     def force_update_device(self, device_name: str):
-        """Force immediate cache update for a specific device"""
+        """Force immediate cache update for a specific device
+        
+        Runs inline rather than on the worker processes, so a request never
+        queues behind the scheduler's own refreshes.
+        """
         logger.info(f"Force updating cache for device: {device_name}")
         self._update_device_cache(device_name, 'weekly')
         self._update_device_cache(device_name, 'alltime')
         
-    def get_cache_status(self) -> Dict:
-        """Get current cache status for all devices"""
+    def get_cache_status(self, limit: int = 500) -> Dict:
+        """Get current cache status per device and type, soonest to expire first"""
         try:
             with db.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get cache status
-                cursor.execute("""
-                    SELECT device_name, cache_type, updated_at, next_update,
-                           COUNT(*) as cached_locations
-                    FROM cached_top_locations
-                    GROUP BY device_name, cache_type
-                    ORDER BY device_name, cache_type
-                """)
-                
-                cache_status = cursor.fetchall()
+                # Unbuffered cursor: rows are built as they arrive instead of being
+                # buffered by the driver and then copied
+                cursor = conn.cursor(db_driver.cursors.SSDictCursor)
+                try:
+                    cursor.execute("""
+                        SELECT device_name, cache_type, MAX(updated_at) AS updated_at,
+                               MIN(next_update) AS next_update, COUNT(*) AS cached_locations
+                        FROM cached_top_locations
+                        GROUP BY device_name, cache_type
+                        ORDER BY next_update, device_name, cache_type
+                        LIMIT %s
+                    """, (limit,))
+                    cache_status = [row for row in cursor]
+                finally:
+                    cursor.close()
                 
                 return {
                     'running': self.running,
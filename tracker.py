@@ -1,17 +1,34 @@
 import time
-import json
 import os
 import logging
+import re
 import http.cookiejar as cookiejar
-import shutil
-import pytz
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 from pyicloud import PyiCloudService
 from pyicloud.exceptions import PyiCloudFailedLoginException, PyiCloudAPIResponseException
+from requests.adapters import HTTPAdapter
+from requests.cookies import create_cookie
+from urllib3.util.retry import Retry
 from config import Config
 from database import db
 from analytics import analytics
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -23,6 +40,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# How long a successful device probe vouches for the iCloud session across restarts
+SESSION_VERIFY_GRACE = timedelta(minutes=5)
+
+# Connections kept open to each iCloud host; above the poll's device thread count
+# so concurrent device lookups never wait on the pool
+ICLOUD_HTTP_POOL_SIZE = 16
+
+# Below this many entries numpy's setup costs more than the per-entry checks save
+VECTORIZE_MIN_ENTRIES = 64
+
+# Ways pyicloud versions expose a device's name and location, in the order they
+# are tried. Each getter takes (device, get_status) and may raise; a given
+# device type answers through exactly one of them, which is remembered per type.
+_NAME_GETTERS = (
+    ('device.name', lambda device, get_status: device.name),
+    ("device['name']", lambda device, get_status: device['name']),
+    ("device.status()['name']", lambda device, get_status: get_status()['name']),
+    ('device.device_name', lambda device, get_status: device.device_name),
+    ('device.deviceName', lambda device, get_status: device.deviceName),
+    ('device.display_name', lambda device, get_status: device.display_name),
+    ('device.displayName', lambda device, get_status: device.displayName),
+)
+_LOCATION_GETTERS = (
+    ('device.location()', lambda device, get_status: device.location()),
+    ("device.status()['location']", lambda device, get_status: get_status().get('location')),
+    ('device._location', lambda device, get_status: device._location),
+)
+
+def _dumps_session(session_cookies) -> str:
+    """Serialize session cookies for the sessions table (a text column)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(session_cookies).decode()
+    return json.dumps(session_cookies)
+
+def _loads_session(session_data):
+    """Parse session cookies saved by _dumps_session"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(session_data)
+    return json.loads(session_data)
+
+# Every device in a poll shares one timestamp string, so it is parsed once per
+# poll; datetimes are immutable, so handing out the cached object is safe
+@lru_cache(maxsize=128)
+def _parse_iso(timestamp_str):
+    """Parse an ISO 8601 timestamp, accepting a trailing 'Z' for UTC"""
+    # fromisoformat is implemented in C; only 'Z' needs rewriting before Python 3.11
+    if timestamp_str.endswith('Z'):
+        return datetime.fromisoformat(timestamp_str[:-1] + '+00:00')
+    return datetime.fromisoformat(timestamp_str)
+
 class iCloudTracker:
     def __init__(self):
         self.api = None
@@ -30,41 +97,33 @@ class iCloudTracker:
         self.max_delay = Config.MAX_DELAY
         self.consecutive_failures = 0
         self.max_consecutive_failures = 5
-        self.timezone = Config.get_timezone()
+        self.timezone = ZoneInfo(Config.TIMEZONE)
+        self._utc = timezone.utc
+        self._session_verified_at = None
+        self._last_cleanup = None  # date of the last nightly cleanup
+        # Index into _NAME_GETTERS / _LOCATION_GETTERS that last worked, per device type
+        self._lookup_paths = {'name': {}, 'location': {}}
         
         # Migrate existing JSON data to database on first run
         self.migrate_existing_data()
         
     def get_current_time_cst(self):
         """Get current time in CST timezone"""
-        utc_now = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        cst_now = utc_now.astimezone(self.timezone)
-        return cst_now.isoformat()
+        # now(tz) converts from the system clock's UTC in one step
+        return datetime.now(self.timezone).isoformat()
     
     def convert_to_cst(self, timestamp_str):
         """Convert timestamp to CST"""
         try:
             # Parse timestamp (could be various formats)
             if isinstance(timestamp_str, str):
-                if 'T' in timestamp_str:
-                    if timestamp_str.endswith('Z'):
-                        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    elif '+' in timestamp_str or timestamp_str.count(':') > 2:
-                        dt = datetime.fromisoformat(timestamp_str)
-                    else:
-                        dt = datetime.fromisoformat(timestamp_str)
-                        if dt.tzinfo is None:
-                            dt = pytz.UTC.localize(dt)
-                else:
-                    dt = datetime.fromisoformat(timestamp_str)
-                    if dt.tzinfo is None:
-                        dt = pytz.UTC.localize(dt)
+                dt = _parse_iso(timestamp_str)
             else:
                 dt = timestamp_str
                 
-            # Convert to CST
+            # Convert to CST, treating naive timestamps as UTC
             if dt.tzinfo is None:
-                dt = pytz.UTC.localize(dt)
+                dt = dt.replace(tzinfo=self._utc)
             
             cst_dt = dt.astimezone(self.timezone)
             return cst_dt.isoformat()
@@ -84,8 +143,10 @@ class iCloudTracker:
         required_fields = ['device_name', 'latitude', 'longitude', 'timestamp']
         valid_entries = []
         current_time = datetime.now()
+        ages = {}
+        coords_ok = self._coordinate_mask(location_data)
         
-        for entry in location_data:
+        for index, entry in enumerate(location_data):
             is_valid = True
             
             # Check required fields
@@ -98,28 +159,34 @@ class iCloudTracker:
             if not is_valid:
                 continue
                 
-            # Validate coordinates
-            try:
-                lat = float(entry['latitude'])
-                lon = float(entry['longitude'])
-                
-                if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                    logger.warning(f"Invalid coordinates for {entry['device_name']}: {lat}, {lon}")
-                    is_valid = False
+            # Validate coordinates (rows the batch check accepted need no second look;
+            # rejected ones go through here to log the specific reason)
+            if coords_ok is None or not coords_ok[index]:
+                try:
+                    lat = float(entry['latitude'])
+                    lon = float(entry['longitude'])
                     
-            except (ValueError, TypeError):
-                logger.warning(f"Invalid coordinate format for {entry['device_name']}: {entry['latitude']}, {entry['longitude']}")
-                is_valid = False
+                    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+                        logger.warning(f"Invalid coordinates for {entry['device_name']}: {lat}, {lon}")
+                        is_valid = False
+                        
+                except (ValueError, TypeError):
+                    logger.warning(f"Invalid coordinate format for {entry['device_name']}: {entry['latitude']}, {entry['longitude']}")
+                    is_valid = False
             
             if not is_valid:
                 continue
                 
             # Validate timestamp and check for stale data
             try:
-                location_time = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                
-                # Check if location is older than 24 hours (likely stale)
-                age_hours = (current_time - location_time.replace(tzinfo=None)).total_seconds() / 3600
+                # Check if location is older than 24 hours (likely stale); entries
+                # from one poll share a timestamp, so each distinct one is aged once
+                timestamp_str = entry['timestamp']
+                age_hours = ages.get(timestamp_str)
+                if age_hours is None:
+                    location_time = _parse_iso(timestamp_str)
+                    age_hours = (current_time - location_time.replace(tzinfo=None)).total_seconds() / 3600
+                    ages[timestamp_str] = age_hours
                 
                 if age_hours > 24:
                     logger.warning(f"Potentially stale location data for {entry['device_name']}: {age_hours:.1f} hours old")
@@ -147,12 +214,38 @@ class iCloudTracker:
         
         return valid_entries
 
-    def backup_database(self):
-        """Create a backup of the database"""
+    def _coordinate_mask(self, location_data):
+        """Range-check every entry's latitude/longitude in one numpy pass
+        
+        Returns a per-entry list of booleans, or None when numpy is unavailable, the
+        batch is small, or a value can't be converted, in which case the per-entry
+        checks handle everything. Missing and non-numeric values come out as NaN,
+        which fails the range test.
+        """
+        if not NUMPY_AVAILABLE or len(location_data) < VECTORIZE_MIN_ENTRIES:
+            return None
         try:
-            db.backup_database()
-        except Exception as e:
-            logger.error(f"Failed to create database backup: {e}")
+            lats = np.array([entry.get('latitude') for entry in location_data], dtype=np.float64)
+            lons = np.array([entry.get('longitude') for entry in location_data], dtype=np.float64)
+        except (ValueError, TypeError):
+            return None
+        return ((np.abs(lats) <= 90) & (np.abs(lons) <= 180)).tolist()
+
+    def _seed_cookie_jar(self, cookie_dir, session_cookies):
+        """Write saved cookies to pyicloud's cookie jar file if it doesn't exist yet
+        
+        pyicloud keeps its jar at cookie_dir/<account name with non-word characters
+        removed> and loads it when the service is constructed. An existing jar is
+        newer than the database copy, so it is left alone.
+        """
+        jar_path = os.path.join(cookie_dir, re.sub(r'\W', '', Config.ICLOUD_EMAIL))
+        if os.path.exists(jar_path):
+            return
+        jar = cookiejar.LWPCookieJar(jar_path)
+        for name, value in session_cookies.items():
+            jar.set_cookie(create_cookie(name, value, domain='.icloud.com'))
+        jar.save(ignore_discard=True, ignore_expires=True)
+        logger.debug("Seeded iCloud cookie jar from saved session")
 
     def get_icloud_service(self):
         """Log in to iCloud and handle 2FA if necessary."""
@@ -163,37 +256,40 @@ class iCloudTracker:
             return None
             
         try:
-            # Clean up expired sessions first
-            db.cleanup_expired_sessions()
+            cookie_dir = Config.ICLOUD_COOKIE_DIR
+            # The jar holds live auth tokens: keep the directory private to this
+            # user, including one created before this was enforced
+            os.makedirs(cookie_dir, mode=0o700, exist_ok=True)
+            os.chmod(cookie_dir, 0o700)
             
-            # Try to load saved session from database first
+            # Seed pyicloud's cookie jar from the saved session (expired rows are
+            # filtered by the query; cleanup_old_data marks them invalid nightly)
             session_data = db.get_valid_session()
             if session_data:
-                logger.debug("Loading saved session from database...")
                 try:
-                    api = PyiCloudService(Config.ICLOUD_EMAIL, Config.ICLOUD_PASSWORD)
-                    # Parse session data and restore
-                    session_cookies = json.loads(session_data)
-                    # Restore cookies to session
-                    for name, value in session_cookies.items():
-                        api.session.cookies.set(name, value)
-                    
-                    # Test if session is still valid
-                    try:
-                        _ = api.devices
-                        logger.info("Session restored successfully from database.")
-                        return api
-                    except (PyiCloudAPIResponseException, Exception) as e:
-                        logger.warning(f"Session invalid ({e}), logging in again.")
+                    self._seed_cookie_jar(cookie_dir, _loads_session(session_data))
                 except Exception as e:
-                    logger.error(f"Failed to load saved session: {e}")
+                    logger.warning(f"Failed to restore saved session cookies: {e}")
             
-            # If no session or session invalid, create new connection
-            logger.info("Creating new iCloud session.")
-            api = PyiCloudService(Config.ICLOUD_EMAIL, Config.ICLOUD_PASSWORD)
+            # pyicloud resumes the session stored in cookie_dir when it is still valid
+            # and only falls back to a full password login when it isn't
+            logger.info("Connecting to iCloud.")
+            api = PyiCloudService(Config.ICLOUD_EMAIL, Config.ICLOUD_PASSWORD,
+                                  cookie_directory=cookie_dir)
+            
+            # Keep-alive pool sized for the device threads, with backoff on transient
+            # 429/5xx (urllib3 only retries idempotent methods by default). The last
+            # response is still handed back so pyicloud's own error handling applies.
+            api.session.mount('https://', HTTPAdapter(
+                pool_connections=ICLOUD_HTTP_POOL_SIZE,
+                pool_maxsize=ICLOUD_HTTP_POOL_SIZE,
+                max_retries=Retry(total=3, backoff_factor=0.5,
+                                  status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+            ))
             
             # Check if 2FA is required
-            if api.requires_2fa:
+            needed_2fa = api.requires_2fa
+            if needed_2fa:
                 logger.info("2FA authentication required.")
                 code = input("Enter the 2FA verification code: ")
                 if not api.validate_2fa_code(code):
@@ -201,24 +297,36 @@ class iCloudTracker:
                     raise PyiCloudFailedLoginException("Failed to verify 2FA code.")
                 logger.info("2FA verification successful.")
             
+            # A session that resumed without 2FA and passed the device probe a few
+            # minutes ago (in this process or the previous one) is trusted as is
+            if not needed_2fa:
+                verified_at = self._session_verified_at
+                if verified_at is not None:
+                    recently_verified = datetime.now() - verified_at < SESSION_VERIFY_GRACE
+                else:
+                    # Compared on the database clock, which stamped created_at
+                    recently_verified = db.session_verified_within(int(SESSION_VERIFY_GRACE.total_seconds()))
+                if recently_verified:
+                    logger.info("iCloud session verified recently; skipping device probe.")
+                    return api
+            
             # Verify login by accessing devices
             try:
                 devices = api.devices
                 device_list = list(devices)
                 logger.info(f"Successfully authenticated. Found {len(device_list)} devices.")
+                self._session_verified_at = datetime.now()
             except Exception as e:
                 logger.error(f"Failed to access devices after authentication: {e}")
                 raise PyiCloudFailedLoginException(f"Authentication verification failed: {e}")
             
             # Save session to database with 30-day expiration
             try:
-                session_cookies = {}
-                for cookie in api.session.cookies:
-                    session_cookies[cookie.name] = cookie.value
+                session_cookies = api.session.cookies.get_dict()
                 
                 # Set expiration to 30 days from now
                 expires_at = (datetime.now() + timedelta(days=30)).isoformat()
-                db.save_session(json.dumps(session_cookies), expires_at)
+                db.save_session(_dumps_session(session_cookies), expires_at)
                 logger.info("Session saved to database with 30-day expiration.")
             except Exception as e:
                 logger.warning(f"Failed to save session: {e}")
@@ -248,7 +356,8 @@ class iCloudTracker:
                 logger.error("No valid location data to save")
                 return False
             
-            # Note: Backups are now handled by scheduled backup system (3x daily)
+            # Backups are not taken here: a dump per poll is O(database size) I/O.
+            # backup_scheduler runs them at BACKUP_SCHEDULE_TIMES instead.
             
             # Save to database
             success = db.save_location_data(valid_location_data)
@@ -268,179 +377,179 @@ class iCloudTracker:
             logger.error(f"Error saving location data: {e}")
             return False
 
-    def fetch_device_locations(self):
-        """Fetch locations for all devices"""
+    def _first_value(self, kind, getters, device, get_status):
+        """Return the first truthy value from getters, trying the path that last worked for this device type first"""
+        paths = self._lookup_paths[kind]
+        device_type = type(device)
+        preferred = paths.get(device_type)
+        order = range(len(getters))
+        if preferred is not None:
+            order = (preferred, *(index for index in order if index != preferred))
+        
+        for index in order:
+            label, getter = getters[index]
+            try:
+                value = getter(device, get_status)
+            except Exception as e:
+                logger.debug("%s failed: %s", label, e)
+                continue
+            if value:
+                logger.debug("%s returned: %s", label, value)
+                paths[device_type] = index
+                return value
+        return None
+    
+    def _process_device(self, device, timestamp):
+        """Resolve one device's name, location and battery info into a location entry
+        
+        Returns None when the device has no usable location.
+        """
         try:
-            logger.debug("Fetching devices from iCloud API")
-            devices = self.api.devices
-            current_locations = []
-            timestamp = self.get_current_time_cst()
+            # Each device.status() call makes pyicloud refresh from iCloud, so
+            # fetch it at most once per device per poll
+            status_fetched = False
+            status_result = status_error = None
             
-            for device in devices:
-                try:
-                    # Try multiple methods to get device name
-                    device_name = None
-                    
-                    # Method 1: Try device.name attribute
-                    if hasattr(device, 'name') and device.name:
-                        device_name = device.name
-                        logger.debug(f"Method 1 - device.name: {device_name}")
-                    
-                    # Method 2: Try device['name'] if it's a dict-like object
-                    if not device_name:
-                        try:
-                            device_name = device['name']
-                            logger.debug(f"Method 2 - device['name']: {device_name}")
-                        except (KeyError, TypeError):
-                            pass
-                    
-                    # Method 3: Try device.status() and extract name
-                    if not device_name:
-                        try:
-                            device_info = device.status()
-                            if isinstance(device_info, dict) and 'name' in device_info:
-                                device_name = device_info['name']
-                                logger.debug(f"Method 3 - device.status()['name']: {device_name}")
-                        except Exception as e:
-                            logger.debug(f"Method 3 failed: {e}")
-                    
-                    # Method 4: Try other common name attributes
-                    if not device_name:
-                        for attr in ['device_name', 'deviceName', 'display_name', 'displayName']:
-                            if hasattr(device, attr) and getattr(device, attr):
-                                device_name = getattr(device, attr)
-                                logger.debug(f"Method 4 - device.{attr}: {device_name}")
-                                break
-                    
-                    # Default if all methods fail
-                    if not device_name:
-                        device_name = f"Unknown device ({type(device).__name__})"
-                        
-                    logger.debug(f"Final device name: {device_name}")
-                    logger.debug(f"Device object type: {type(device)}")
-                    logger.debug(f"Device attributes: {[attr for attr in dir(device) if not attr.startswith('_')]}")
-                    
-                    # Try multiple methods to get location data
-                    location = None
-                    
-                    # Method 1: Try device.location() if it exists
-                    if hasattr(device, 'location'):
-                        try:
-                            location = device.location()
-                            logger.debug(f"Method 1 - device.location() returned: {location}")
-                        except Exception as e:
-                            logger.debug(f"Method 1 failed: {e}")
-                    
-                    # Method 2: Try device.status() and extract location
-                    if not location:
-                        try:
-                            device_info = device.status()
-                            location = device_info.get('location')
-                            logger.debug(f"Method 2 - device.status()['location'] returned: {location}")
-                        except Exception as e:
-                            logger.debug(f"Method 2 failed: {e}")
+            def get_status():
+                nonlocal status_fetched, status_result, status_error
+                if not status_fetched:
+                    status_fetched = True
+                    try:
+                        status_result = device.status()
+                    except Exception as e:
+                        status_error = e
+                if status_error is not None:
+                    raise status_error
+                return status_result
+            
+            # Try each known way of reading the device name, starting with the one
+            # that worked for this device type last poll
+            device_name = self._first_value('name', _NAME_GETTERS, device, get_status)
+            
+            # Default if all methods fail
+            if not device_name:
+                device_name = f"Unknown device ({type(device).__name__})"
+                
+            # Checked once per device; the reflection dumps below only run at DEBUG
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            if debug_enabled:
+                logger.debug("Final device name: %s", device_name)
+                logger.debug("Device object type: %s", type(device))
+                logger.debug("Device attributes: %s", [attr for attr in dir(device) if not attr.startswith('_')])
+            
+            # Same for the location data
+            location = self._first_value('location', _LOCATION_GETTERS, device, get_status)
+            
+            # Process location if found
+            if location:
+                logger.debug("Location object for %s: %s", device_name, location)
+                
+                # Try different ways to extract lat/lng
+                latitude = longitude = None
+                
+                # Try direct access
+                if isinstance(location, dict):
+                    latitude = location.get('latitude')
+                    longitude = location.get('longitude')
+                
+                # Try as object attributes
+                if latitude is None and hasattr(location, 'latitude'):
+                    latitude = location.latitude
+                if longitude is None and hasattr(location, 'longitude'):
+                    longitude = location.longitude
                     
-                    # Method 3: Try direct access to location property
-                    if not location and hasattr(device, '_location'):
-                        try:
-                            location = device._location
-                            logger.debug(f"Method 3 - device._location returned: {location}")
-                        except Exception as e:
-                            logger.debug(f"Method 3 failed: {e}")
+                # Try alternative names
+                if latitude is None and hasattr(location, 'lat'):
+                    latitude = location.lat
+                if longitude is None and hasattr(location, 'lng'):
+                    longitude = location.lng
+                
+                logger.debug("Extracted coordinates for %s: lat=%s, lng=%s", device_name, latitude, longitude)
+                
+                if latitude is not None and longitude is not None:
+                    # Try to extract additional device information
+                    accuracy = None
+                    battery_level = None
+                    is_charging = None
                     
-                    # Process location if found
-                    if location:
-                        logger.debug(f"Location object for {device_name}: {location}")
-                        
-                        # Try different ways to extract lat/lng
-                        latitude = longitude = None
-                        
-                        # Try direct access
-                        if isinstance(location, dict):
-                            latitude = location.get('latitude')
-                            longitude = location.get('longitude')
-                        
-                        # Try as object attributes
-                        if latitude is None and hasattr(location, 'latitude'):
-                            latitude = location.latitude
-                        if longitude is None and hasattr(location, 'longitude'):
-                            longitude = location.longitude
-                            
-                        # Try alternative names
-                        if latitude is None and hasattr(location, 'lat'):
-                            latitude = location.lat
-                        if longitude is None and hasattr(location, 'lng'):
-                            longitude = location.lng
-                        
-                        logger.debug(f"Extracted coordinates for {device_name}: lat={latitude}, lng={longitude}")
-                        
-                        if latitude is not None and longitude is not None:
-                            # Try to extract additional device information
-                            accuracy = None
-                            battery_level = None
-                            is_charging = None
-                            
-                            # Try to get device status for battery and charging info
-                            try:
-                                device_info = device.status()
-                                if isinstance(device_info, dict):
-                                    # Extract battery information
-                                    if 'batteryLevel' in device_info:
-                                        battery_level = device_info['batteryLevel']
-                                    elif 'battery_level' in device_info:
-                                        battery_level = device_info['battery_level']
-                                    
-                                    # Extract charging status
-                                    if 'batteryStatus' in device_info:
-                                        # batteryStatus can be "Charging", "NotCharging", "Unknown", etc.
-                                        is_charging = device_info['batteryStatus'].lower() == 'charging'
-                                    elif 'charging' in device_info:
-                                        is_charging = device_info['charging']
-                                    elif 'isCharging' in device_info:
-                                        is_charging = device_info['isCharging']
-                                    
-                                    logger.debug(f"Device status for {device_name}: {device_info}")
-                            except Exception as e:
-                                logger.debug(f"Could not get device status for {device_name}: {e}")
-                            
-                            # Try to get location accuracy from location object
-                            try:
-                                if isinstance(location, dict):
-                                    if 'horizontalAccuracy' in location:
-                                        accuracy = location['horizontalAccuracy']
-                                    elif 'accuracy' in location:
-                                        accuracy = location['accuracy']
-                                elif hasattr(location, 'horizontalAccuracy'):
-                                    accuracy = location.horizontalAccuracy
-                                elif hasattr(location, 'accuracy'):
-                                    accuracy = location.accuracy
-                                
-                                logger.debug(f"Location accuracy for {device_name}: {accuracy}")
-                            except Exception as e:
-                                logger.debug(f"Could not get location accuracy for {device_name}: {e}")
+                    # Try to get device status for battery and charging info
+                    try:
+                        device_info = get_status()
+                        if isinstance(device_info, dict):
+                            # Extract battery information
+                            if 'batteryLevel' in device_info:
+                                battery_level = device_info['batteryLevel']
+                            elif 'battery_level' in device_info:
+                                battery_level = device_info['battery_level']
                             
-                            location_entry = {
-                                'device_name': device_name,
-                                'latitude': latitude,
-                                'longitude': longitude,
-                                'timestamp': timestamp,
-                                'accuracy': accuracy,
-                                'battery_level': battery_level,
-                                'is_charging': is_charging
-                            }
-                            current_locations.append(location_entry)
+                            # Extract charging status
+                            if 'batteryStatus' in device_info:
+                                # batteryStatus can be "Charging", "NotCharging", "Unknown", etc.
+                                is_charging = device_info['batteryStatus'].lower() == 'charging'
+                            elif 'charging' in device_info:
+                                is_charging = device_info['charging']
+                            elif 'isCharging' in device_info:
+                                is_charging = device_info['isCharging']
                             
-                            logger.info(f"Device {device_name} Location: {latitude}, {longitude} at {timestamp}")
-                        else:
-                            logger.warning(f"Invalid location coordinates for {device_name}: lat={latitude}, lng={longitude}")
-                    else:
-                        logger.warning(f"No location available for {device_name}")
+                            if debug_enabled:
+                                logger.debug("Device status for %s: %s", device_name, device_info)
+                    except Exception as e:
+                        logger.debug("Could not get device status for %s: %s", device_name, e)
+                    
+                    # Try to get location accuracy from location object
+                    try:
+                        if isinstance(location, dict):
+                            if 'horizontalAccuracy' in location:
+                                accuracy = location['horizontalAccuracy']
+                            elif 'accuracy' in location:
+                                accuracy = location['accuracy']
+                        elif hasattr(location, 'horizontalAccuracy'):
+                            accuracy = location.horizontalAccuracy
+                        elif hasattr(location, 'accuracy'):
+                            accuracy = location.accuracy
                         
-                except Exception as e:
-                    logger.error(f"Error processing device {device}: {e}")
-                    import traceback
-                    logger.debug(f"Full traceback: {traceback.format_exc()}")
-                    continue
+                        logger.debug("Location accuracy for %s: %s", device_name, accuracy)
+                    except Exception as e:
+                        logger.debug("Could not get location accuracy for %s: %s", device_name, e)
+                    
+                    location_entry = {
+                        'device_name': device_name,
+                        'latitude': latitude,
+                        'longitude': longitude,
+                        'timestamp': timestamp,
+                        'accuracy': accuracy,
+                        'battery_level': battery_level,
+                        'is_charging': is_charging
+                    }
+                    logger.info(f"Device {device_name} Location: {latitude}, {longitude} at {timestamp}")
+                    return location_entry
+                else:
+                    logger.warning(f"Invalid location coordinates for {device_name}: lat={latitude}, lng={longitude}")
+            else:
+                logger.warning(f"No location available for {device_name}")
+                
+        except Exception as e:
+            logger.error(f"Error processing device {device}: {e}")
+            # exc_info lets logging format the traceback only when DEBUG is enabled
+            logger.debug("Full traceback:", exc_info=True)
+        return None
+
+    def fetch_device_locations(self):
+        """Fetch locations for all devices"""
+        try:
+            logger.debug("Fetching devices from iCloud API")
+            devices = list(self.api.devices)
+            current_locations = []
+            timestamp = self.get_current_time_cst()
+            
+            # Devices are fetched concurrently: each one waits on its own iCloud
+            # round trips, so a poll takes about as long as the slowest device
+            if devices:
+                with ThreadPoolExecutor(max_workers=min(8, len(devices)),
+                                        thread_name_prefix='icloud-device') as executor:
+                    results = list(executor.map(self._process_device, devices,
+                                                [timestamp] * len(devices)))
+                current_locations = [entry for entry in results if entry is not None]
             
             if current_locations:
                 if self.save_location_data(current_locations):
@@ -470,6 +579,7 @@ class iCloudTracker:
         try:
             # Clean up data older than 30 days
             db.cleanup_old_data(days_to_keep=30)
+            db.cleanup_expired_sessions()
         except Exception as e:
             logger.error(f"Failed to cleanup old data: {e}")
 
@@ -499,9 +609,12 @@ class iCloudTracker:
                 # Fetch device locations
                 self.fetch_device_locations()
                 
-                # Periodic cleanup (every 24 hours)
-                if datetime.now().hour == 2 and datetime.now().minute < 5:  # Run around 2 AM
+                # Periodic cleanup, once a day during the 2 AM hour. The date guard
+                # keeps it to one run, so the window can span a whole poll interval.
+                now = datetime.now()
+                if now.hour == 2 and self._last_cleanup != now.date():
                     self.cleanup_old_data()
+                    self._last_cleanup = now.date()
                 
                 # Log status
                 logger.info(f"Waiting {self.delay // 60} minutes before next request... (Failures: {self.consecutive_failures})")